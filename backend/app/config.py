@@ -1,3 +1,4 @@
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 from typing import Optional
 
@@ -7,16 +8,112 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8000
     
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json or text
+    LOG_DEBUG_SAMPLE_RATE: float = 1.0  # fraction of requests whose DEBUG lines are kept
+    
+    # Tracing (OpenTelemetry); exporter: file, otlp or console
+    TRACING_ENABLED: bool = False
+    TRACING_EXPORTER: str = "file"
+    TRACING_FILE_PATH: str = "./data/traces.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_SAMPLE_RATE: float = 1.0
+    
+    # Admin-only diagnostics (profiling); disabled unless a token is set
+    ADMIN_TOKEN: Optional[str] = None
+    PROFILE_MAX_SECONDS: int = 60
+    
     # LLM Configuration
     GEMINI_API_KEY: str  
     
+    # Auth provider: "firebase", or "local" to accept our own JWTs (requires STORAGE_BACKEND=sql)
+    AUTH_PROVIDER: str = "firebase"
+    
     # Firebase
-    FIREBASE_CREDENTIALS_PATH: str
-    FIREBASE_DATABASE_URL: str
+    FIREBASE_CREDENTIALS_PATH: str = ""
+    FIREBASE_DATABASE_URL: str = ""
+    
+    # Storage backend: "firebase" or "sql"
+    STORAGE_BACKEND: str = "firebase"
+    DATABASE_URL: str = "sqlite:///./quizbot.db"
+    DATABASE_ASYNC: bool = False
+    DATABASE_ECHO: bool = False
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_RECYCLE: int = 1800
+    # Generated quizzes not submitted within this many hours expire (0 keeps them)
+    QUIZ_EXPIRY_HOURS: int = 168
+    QUIZ_PURGE_INTERVAL: int = 3600  # seconds between purges of expired quizzes
+    
+    # LLM provider: "gemini" or "fake" (offline load testing)
+    LLM_PROVIDER: str = "gemini"
+    LLM_MODEL: str = "gemini-2.5-flash"
+    LLM_MAX_CONCURRENCY: int = 4
+    LLM_REQUESTS_PER_MINUTE: int = 0  # 0 disables client-side rate limiting
+    LLM_EMAIL_TOKEN_BUDGET: int = 750
+    LLM_CONTEXT_TOKEN_BUDGET: int = 125
+    LLM_CONTEXT_CACHE: bool = False
+    LLM_STRUCTURED_OUTPUT: bool = True
+    LLM_CONTEXT_CACHE_TTL: int = 3600
+    
+    # Near-duplicate detection: emails whose entity-masked shingles are at least
+    # NEAR_DUPLICATE_THRESHOLD similar (estimated Jaccard) reuse one generation
+    NEAR_DUPLICATE_ENABLED: bool = False
+    NEAR_DUPLICATE_THRESHOLD: float = 0.8
+    NEAR_DUPLICATE_MAX_ENTRIES: int = 10000
+    NEAR_DUPLICATE_MIN_WORDS: int = 20
+    
+    # Batch generation
+    BATCH_MAX_EMAILS: int = 500
+    BATCH_MAX_CONCURRENCY: int = 4
+    
+    # Fake LLM provider (LLM_PROVIDER=fake)
+    FAKE_LLM_LATENCY_DISTRIBUTION: str = "lognormal"  # fixed, normal or lognormal
+    FAKE_LLM_LATENCY_MS: float = 800
+    FAKE_LLM_LATENCY_STDDEV_MS: float = 300
+    FAKE_LLM_RATE_LIMIT_RATE: float = 0.0
+    FAKE_LLM_SERVER_ERROR_RATE: float = 0.0
+    FAKE_LLM_EMPTY_RATE: float = 0.0
+    FAKE_LLM_SEED: Optional[int] = None
+    
+    # Background quiz generation jobs
+    JOB_QUEUE_PATH: str = "./data/jobs.db"
+    JOB_WORKERS: int = 4
+    JOB_POLL_INTERVAL: float = 0.5
+    # Running jobs renew a lease; one not renewed for this long (its process
+    # died) is re-queued by any live worker
+    JOB_LEASE_SECONDS: int = 300
+    JOB_RETENTION_HOURS: int = 24  # finished jobs are deleted after this long (0 keeps them)
+    
+    # Question bank
+    QUESTION_BANK_ENABLED: bool = False
+    QUESTION_BANK_TARGET_SIZE: int = 20
+    QUESTION_BANK_OFFPEAK_HOURS: str = "1-6"
+    QUESTION_BANK_REFILL_INTERVAL: int = 600
+    
+    # HTML email parsing: "lxml" (falls back to bs4 if unavailable or it fails) or "bs4"
+    EMAIL_HTML_PARSER: str = "lxml"
+    
+    # Largest .eml/HTML file accepted by POST /api/quiz/generate-upload
+    UPLOAD_MAX_BYTES: int = 5 * 1024 * 1024
+    
+    # Bulk mbox/maildir ingestion (ingest_emails.py)
+    INGEST_WORKERS: int = 0  # parser processes; 0 uses one per CPU, 1 parses in-process
+    INGEST_BATCH_SIZE: int = 256
+    INGEST_CHECKPOINT_DIR: str = "./data/ingest_checkpoints"
     
     # Vector DB
     VECTOR_DB_TYPE: str = "chromadb"
     VECTOR_DB_PATH: str = "./data/vector_store"
+    VECTOR_FAISS_STORAGE: str = "float32"  # float32, float16 (half the memory) or int8 (a quarter)
+    # Vector store retention, enforced by periodic compaction; 0 disables a limit
+    VECTOR_MAX_DOCUMENTS: int = 0
+    VECTOR_MAX_AGE_DAYS: int = 0
+    VECTOR_MAX_PER_USER: int = 0
+    VECTOR_COMPACTION_DEDUPE: bool = False  # also drop near-duplicates (reads every document)
+    VECTOR_COMPACTION_INTERVAL: int = 0  # seconds between compactions; 0 disables the background job
+    VECTOR_REBUILD_FRACTION: float = 0.2  # rebuild the index once this share of it has been deleted
     
     # Security
     SECRET_KEY: str
@@ -26,6 +123,13 @@ class Settings(BaseSettings):
     # CORS
     FRONTEND_URL: str = "http://localhost:5173"
     
+    @model_validator(mode="after")
+    def check_backend_combination(self):
+        # Local auth skips initializing Firebase, so the Firebase storage backend has no database
+        if self.AUTH_PROVIDER == "local" and self.STORAGE_BACKEND == "firebase":
+            raise ValueError("AUTH_PROVIDER=local requires STORAGE_BACKEND=sql")
+        return self
+    
     class Config:
         env_file = ".env"
 
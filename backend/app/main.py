@@ -1,7 +1,27 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import auth, quiz, analytics
 from app.config import settings
+from app.utils.logger import setup_logging, shutdown_logging, request_id_var
+from app.services.tracing import setup_tracing, shutdown_tracing, span
+
+# Configure logging and tracing before the service modules below initialize
+setup_logging()
+setup_tracing()
+
+from app.routes import auth, quiz, analytics, admin
+from app.services.job_queue import job_queue
+from app.services.question_bank import question_bank
+from app.services.vector_maintenance import vector_maintenance
+from app.services.storage_service import storage_service
+from app.services.metrics import HTTP_LATENCY, HTTP_IN_PROGRESS, render_metrics
+from app.services.profiling import profiling_service, is_admin_request
+import time
+import uuid
+
+# Routes taking multipart uploads, and the allowance for boundaries and form fields around the file
+UPLOAD_PATHS = {"/api/quiz/generate-upload"}
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
 
 app = FastAPI(
     title="QuizBot API",
@@ -18,10 +38,100 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Per-route latency histogram, labelled by route template rather than raw path"""
+    started = time.perf_counter()
+    status = 500
+    HTTP_IN_PROGRESS.inc()
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        HTTP_IN_PROGRESS.dec()
+        route = request.scope.get("route")
+        HTTP_LATENCY.labels(
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=str(status)
+        ).observe(time.perf_counter() - started)
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """Root span per request; renamed to the route template once routing has run"""
+    with span(f"{request.method} {request.url.path}", **{
+        "http.method": request.method,
+        "http.target": request.url.path,
+        "quizbot.request_id": request_id_var.get()
+    }) as current:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if route:
+            current.update_name(f"{request.method} {route.path}")
+            current.set_attribute("http.route", route.path)
+        current.set_attribute("http.status_code", response.status_code)
+        return response
+
+@app.middleware("http")
+async def profile_on_demand(request: Request, call_next):
+    """Admins can send X-Profile: html|text to get a pyinstrument report for the request"""
+    output = request.headers.get("X-Profile")
+    if output and is_admin_request(request):
+        return await profiling_service.profile_request(request, call_next, output)
+    return await call_next(request)
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """413 for upload requests whose Content-Length exceeds the limit, before the body is read
+    
+    Multipart parsing spools the whole body before the route runs, so the
+    route's own size check alone would accept and write oversized files first.
+    """
+    if request.url.path in UPLOAD_PATHS:
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > settings.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File larger than {settings.UPLOAD_MAX_BYTES} bytes"}
+            )
+    return await call_next(request)
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    """Correlate log lines for a request; honours an incoming X-Request-ID"""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # Include Routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(quiz.router, prefix="/api/quiz", tags=["Quiz"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"], include_in_schema=False)
+
+@app.on_event("startup")
+async def start_background_workers():
+    await job_queue.start()
+    if question_bank is not None:
+        await question_bank.start()
+    await vector_maintenance.start()
+    await storage_service.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await job_queue.stop()
+    if question_bank is not None:
+        await question_bank.stop()
+    await vector_maintenance.stop()
+    await storage_service.stop()
+    shutdown_tracing()
+    shutdown_logging()
 
 @app.get("/")
 async def root():
@@ -35,6 +145,12 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,9 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, JSON
+from sqlalchemy import create_engine, event, update, func, Index, UniqueConstraint, Column, Integer, String, Float, DateTime, Text, Boolean, ForeignKey, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.dialects import sqlite, postgresql
 from datetime import datetime
-from typing import Optional
-import os
+from typing import Optional, Dict, List, Tuple
+from app.config import settings
+import logging
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
@@ -82,6 +87,11 @@ class QuizResultDB(Base):
     quiz = relationship("Quiz", back_populates="result")
     user = relationship("User", back_populates="quiz_results")
     
+    # History and analytics always filter by user and order by completion
+    __table_args__ = (
+        Index("ix_quiz_results_user_completed", "user_id", "completed_at"),
+    )
+    
     def __repr__(self):
         return f"<QuizResult(quiz_id={self.quiz_id}, score={self.score})>"
 
@@ -127,23 +137,116 @@ class UserProgress(Base):
     first_attempt = Column(DateTime, default=datetime.utcnow)
     last_attempt = Column(DateTime, default=datetime.utcnow)
     
+    # One row per user/topic, enforced so progress can be upserted in bulk
+    __table_args__ = (
+        UniqueConstraint("user_id", "topic", name="uq_user_progress_user_topic"),
+    )
+    
     def __repr__(self):
         return f"<UserProgress(user_id={self.user_id}, topic={self.topic})>"
 
 
+class QuestionBankSource(Base):
+    """Source email a question bank is built from"""
+    __tablename__ = "question_bank_sources"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source_hash = Column(String(64), unique=True, index=True, nullable=False)
+    content = Column(Text, nullable=False)
+    
+    # Tags
+    category = Column(String(100), nullable=True, index=True)
+    topics = Column(JSON, nullable=False, default=list)
+    
+    # Metadata
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_refilled_at = Column(DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f"<QuestionBankSource(source_hash={self.source_hash}, category={self.category})>"
+
+
+class BankQuestion(Base):
+    """Validated question stored for reuse across quizzes"""
+    __tablename__ = "bank_questions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source_hash = Column(String(64), ForeignKey("question_bank_sources.source_hash"), nullable=False)
+    text_hash = Column(String(64), nullable=False)
+    
+    # Question content
+    difficulty = Column(String(20), nullable=False)
+    question_json = Column(JSON, nullable=False)
+    
+    # Usage
+    times_served = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint("source_hash", "text_hash", name="uq_bank_questions_source_text"),
+        Index("ix_bank_questions_source_difficulty", "source_hash", "difficulty"),
+    )
+    
+    def __repr__(self):
+        return f"<BankQuestion(source_hash={self.source_hash}, difficulty={self.difficulty})>"
+
+
 # Database setup
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./quizbot.db")
+DATABASE_URL = settings.DATABASE_URL
+
+def _async_database_url(url: str) -> str:
+    """Map a sync database URL onto its async driver (aiosqlite/asyncpg)"""
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+def _engine_options(url: str) -> dict:
+    """Shared engine options: statement logging and connection pool tuning"""
+    options = {
+        "echo": settings.DATABASE_ECHO,
+        "pool_pre_ping": True,
+    }
+    # In-memory SQLite and aiosqlite use pools that take no sizing
+    if ":memory:" not in url and "+aiosqlite" not in url:
+        options.update(
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+            pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        )
+    return options
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the writer; NORMAL sync is safe under WAL"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
 
 # Create engine
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-    echo=True  # Set to False in production
+    **_engine_options(DATABASE_URL)
 )
 
 # Create session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Optional async engine so DB calls don't block the event loop
+async_engine = None
+AsyncSessionLocal = None
+if settings.DATABASE_ASYNC:
+    ASYNC_DATABASE_URL = _async_database_url(DATABASE_URL)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **_engine_options(ASYNC_DATABASE_URL))
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+if DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    if async_engine is not None:
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
@@ -152,15 +255,20 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """Dependency to get async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     """Initialize database - create all tables"""
     Base.metadata.create_all(bind=engine)
-    print("✓ Database initialized successfully")
+    logger.info("Database initialized")
 
 def drop_db():
     """Drop all tables (use with caution!)"""
     Base.metadata.drop_all(bind=engine)
-    print("✓ Database tables dropped")
+    logger.warning("Database tables dropped")
 
 # Database utility functions
 class DatabaseService:
@@ -192,15 +300,28 @@ class DatabaseService:
     @staticmethod
     def update_user_stats(db, uid: str, quiz_score: float):
         """Update user statistics after quiz completion"""
-        user = db.query(User).filter(User.uid == uid).first()
-        if user:
-            user.total_quizzes += 1
-            user.total_score += quiz_score
-            user.average_score = user.total_score / user.total_quizzes
-            user.last_quiz_date = datetime.utcnow()
-            db.commit()
-            db.refresh(user)
-        return user
+        DatabaseService._apply_user_stats(db, uid, quiz_score)
+        db.commit()
+        return db.query(User).filter(User.uid == uid).first()
+    
+    @staticmethod
+    def _apply_user_stats(db, uid: str, quiz_score: float):
+        """Bump user stats without committing
+        
+        Issued as a single UPDATE with column arithmetic so concurrent
+        submissions cannot lose increments.
+        """
+        db.execute(
+            update(User)
+            .where(User.uid == uid)
+            .values(
+                total_quizzes=User.total_quizzes + 1,
+                total_score=User.total_score + quiz_score,
+                average_score=(User.total_score + quiz_score) / (User.total_quizzes + 1),
+                last_quiz_date=datetime.utcnow()
+            )
+            .execution_options(synchronize_session=False)
+        )
     
     @staticmethod
     def save_quiz(db, quiz_data: dict):
@@ -216,20 +337,79 @@ class DatabaseService:
         """Get quiz by ID"""
         return db.query(Quiz).filter(Quiz.quiz_id == quiz_id).first()
     
+    @staticmethod
+    def claim_quiz(db, quiz_id: str, user_id: str, not_before: Optional[datetime] = None):
+        """Atomically mark an unexpired, unsubmitted quiz completed before it is evaluated
+        
+        A single conditional UPDATE, so of two concurrent submissions only one
+        matches the row. Returns the quiz, or None if there was nothing to claim.
+        """
+        conditions = [Quiz.quiz_id == quiz_id, Quiz.user_id == user_id, Quiz.is_completed.isnot(True)]
+        if not_before is not None:
+            conditions.append(Quiz.created_at >= not_before)
+        claimed = db.execute(
+            update(Quiz)
+            .where(*conditions)
+            .values(is_completed=True)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.commit()
+        return DatabaseService.get_quiz(db, quiz_id) if claimed else None
+    
+    @staticmethod
+    def release_quiz(db, quiz_id: str):
+        """Undo claim_quiz after a failed evaluation, unless a result was recorded"""
+        db.execute(
+            update(Quiz)
+            .where(Quiz.quiz_id == quiz_id, ~Quiz.result.has())
+            .values(is_completed=False)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    
+    @staticmethod
+    def purge_expired_quizzes(db, not_before: datetime) -> int:
+        """Delete quizzes created before not_before that were never submitted"""
+        deleted = db.query(Quiz).filter(
+            Quiz.is_completed.isnot(True),
+            Quiz.created_at < not_before
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    
     @staticmethod
     def save_quiz_result(db, result_data: dict):
-        """Save quiz result"""
+        """Save quiz result and mark the quiz as completed"""
+        result = DatabaseService._add_quiz_result(db, result_data)
+        db.commit()
+        return result
+    
+    @staticmethod
+    def _add_quiz_result(db, result_data: dict):
+        """Insert a quiz result and flip the quiz's completed flag without committing"""
         result = QuizResultDB(**result_data)
         db.add(result)
-        db.commit()
-        db.refresh(result)
+        db.execute(
+            update(Quiz)
+            .where(Quiz.quiz_id == result_data['quiz_id'])
+            .values(is_completed=True)
+            .execution_options(synchronize_session=False)
+        )
+        return result
+    
+    @staticmethod
+    def record_quiz_submission(db, result_data: dict, topic_stats: Dict[str, Tuple[int, int]]):
+        """Persist a full quiz submission in one transaction
         
-        # Mark quiz as completed
-        quiz = db.query(Quiz).filter(Quiz.quiz_id == result_data['quiz_id']).first()
-        if quiz:
-            quiz.is_completed = True
-            db.commit()
+        Inserts the result, marks the quiz completed, updates user stats and
+        upserts per-topic progress, then commits once.
         
+        topic_stats maps topic -> (attempts, correct).
+        """
+        result = DatabaseService._add_quiz_result(db, result_data)
+        DatabaseService._apply_user_stats(db, result_data['user_id'], result_data['score'])
+        DatabaseService._upsert_user_progress(db, result_data['user_id'], topic_stats)
+        db.commit()
         return result
     
     @staticmethod
@@ -245,28 +425,40 @@ class DatabaseService:
     
     @staticmethod
     def get_user_analytics(db, uid: str):
-        """Get user analytics"""
+        """Get user analytics
+        
+        Totals are aggregated in SQL; only the last 10 results are fetched,
+        and only the columns the trend needs (no results_json blob).
+        """
         user = db.query(User).filter(User.uid == uid).first()
         if not user:
             return None
         
-        # Get all results
-        results = db.query(QuizResultDB).filter(
-            QuizResultDB.user_id == uid
-        ).order_by(
-            QuizResultDB.completed_at.desc()
-        ).all()
-        
         # Calculate analytics
-        total_questions = sum(r.total_questions for r in results)
-        correct_answers = sum(r.correct_answers for r in results)
+        quiz_count, total_questions, correct_answers = db.query(
+            func.count(QuizResultDB.id),
+            func.coalesce(func.sum(QuizResultDB.total_questions), 0),
+            func.coalesce(func.sum(QuizResultDB.correct_answers), 0)
+        ).filter(
+            QuizResultDB.user_id == uid
+        ).one()
         accuracy_rate = (correct_answers / total_questions * 100) if total_questions > 0 else 0
         
         # Get improvement trend (last 10 quizzes)
-        recent_results = results[:10]
+        recent_results = db.query(
+            QuizResultDB.quiz_id,
+            QuizResultDB.score,
+            QuizResultDB.completed_at
+        ).filter(
+            QuizResultDB.user_id == uid
+        ).order_by(
+            QuizResultDB.completed_at.desc()
+        ).limit(10).all()
+        
+        first_quiz_number = quiz_count - len(recent_results) + 1
         improvement_trend = [
             {
-                'quiz_number': len(results) - i,
+                'quiz_number': first_quiz_number + i,
                 'score': r.score,
                 'date': r.completed_at.isoformat()
             }
@@ -285,7 +477,7 @@ class DatabaseService:
                     'score': r.score,
                     'completed_at': r.completed_at.isoformat()
                 }
-                for r in results[:5]
+                for r in recent_results[:5]
             ]
         }
     
@@ -298,30 +490,132 @@ class DatabaseService:
         db.refresh(email)
         return email
     
+    @staticmethod
+    def save_donor_emails(db, rows: List[dict]) -> int:
+        """Insert many donor emails in one statement, skipping email_ids already stored
+        
+        Returns the number of rows inserted. Replaying a batch is a no-op,
+        which is what lets bulk ingestion resume after a crash.
+        """
+        if not rows:
+            return 0
+        
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            insert_fn = postgresql.insert
+        elif dialect == "sqlite":
+            insert_fn = sqlite.insert
+        else:
+            return DatabaseService._insert_new_donor_emails(db, rows)
+        
+        stmt = insert_fn(DonorEmail).values(rows).on_conflict_do_nothing(
+            index_elements=[DonorEmail.email_id]
+        )
+        result = db.execute(stmt)
+        db.commit()
+        return result.rowcount
+    
+    @staticmethod
+    def _insert_new_donor_emails(db, rows: List[dict]) -> int:
+        """Portable fallback: drop email_ids already stored (or repeated), then bulk insert"""
+        ids = [row['email_id'] for row in rows]
+        stored = {
+            email_id for (email_id,) in
+            db.query(DonorEmail.email_id).filter(DonorEmail.email_id.in_(ids))
+        }
+        new_rows = {}
+        for row in rows:
+            if row['email_id'] not in stored:
+                new_rows.setdefault(row['email_id'], row)
+        if new_rows:
+            db.bulk_insert_mappings(DonorEmail, list(new_rows.values()))
+        db.commit()
+        return len(new_rows)
+    
     @staticmethod
     def update_user_progress(db, uid: str, topic: str, is_correct: bool):
         """Update user progress for a topic"""
-        progress = db.query(UserProgress).filter(
+        DatabaseService._upsert_user_progress(db, uid, {topic: (1, int(is_correct))})
+        db.commit()
+        return db.query(UserProgress).filter(
             UserProgress.user_id == uid,
             UserProgress.topic == topic
         ).first()
+    
+    @staticmethod
+    def _upsert_user_progress(db, uid: str, topic_stats: Dict[str, Tuple[int, int]]):
+        """Upsert progress rows for many topics in one INSERT ... ON CONFLICT"""
+        if not topic_stats:
+            return
         
-        if not progress:
-            progress = UserProgress(
-                user_id=uid,
-                topic=topic
-            )
-            db.add(progress)
-        
-        progress.total_attempts += 1
-        if is_correct:
-            progress.correct_answers += 1
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            insert_fn = postgresql.insert
+        elif dialect == "sqlite":
+            insert_fn = sqlite.insert
+        else:
+            DatabaseService._merge_user_progress(db, uid, topic_stats)
+            return
         
-        progress.accuracy_rate = (progress.correct_answers / progress.total_attempts) * 100
-        progress.last_attempt = datetime.utcnow()
+        now = datetime.utcnow()
+        stmt = insert_fn(UserProgress).values([
+            {
+                'user_id': uid,
+                'topic': topic,
+                'total_attempts': attempts,
+                'correct_answers': correct,
+                'accuracy_rate': correct * 100.0 / attempts if attempts else 0.0,
+                'first_attempt': now,
+                'last_attempt': now
+            }
+            for topic, (attempts, correct) in topic_stats.items()
+        ])
+        total_attempts = UserProgress.total_attempts + stmt.excluded.total_attempts
+        correct_answers = UserProgress.correct_answers + stmt.excluded.correct_answers
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserProgress.user_id, UserProgress.topic],
+            set_={
+                'total_attempts': total_attempts,
+                'correct_answers': correct_answers,
+                'accuracy_rate': correct_answers * 100.0 / total_attempts,
+                'last_attempt': stmt.excluded.last_attempt
+            }
+        )
+        db.execute(stmt)
+    
+    @staticmethod
+    def _merge_user_progress(db, uid: str, topic_stats: Dict[str, Tuple[int, int]]):
+        """Portable upsert for dialects without ON CONFLICT: lock, then update or insert
         
-        db.commit()
-        db.refresh(progress)
-        return progress
+        Runs in the caller's transaction; nothing is committed here.
+        """
+        now = datetime.utcnow()
+        existing = {
+            row.topic: row
+            for row in db.query(UserProgress).filter(
+                UserProgress.user_id == uid,
+                UserProgress.topic.in_(list(topic_stats))
+            ).with_for_update()
+        }
+        for topic, (attempts, correct) in topic_stats.items():
+            row = existing.get(topic)
+            if row is None:
+                db.add(UserProgress(
+                    user_id=uid,
+                    topic=topic,
+                    total_attempts=attempts,
+                    correct_answers=correct,
+                    accuracy_rate=correct * 100.0 / attempts if attempts else 0.0,
+                    first_attempt=now,
+                    last_attempt=now
+                ))
+                continue
+            row.total_attempts = (row.total_attempts or 0) + attempts
+            row.correct_answers = (row.correct_answers or 0) + correct
+            row.accuracy_rate = (
+                row.correct_answers * 100.0 / row.total_attempts if row.total_attempts else 0.0
+            )
+            row.last_attempt = now
+        db.flush()
 
 db_service = DatabaseService()
\ No newline at end of file
@@ -29,10 +29,18 @@ class Question(BaseModel):
     explanation: str
     difficulty: str
 
+class QuestionSet(BaseModel):
+    """Response schema for structured quiz generation"""
+    questions: List[Question]
+
 class QuizGenerate(BaseModel):
     donor_email: str
     num_questions: int = 5
 
+class QuizBatchGenerate(BaseModel):
+    donor_emails: List[str]
+    num_questions: int = 5
+
 class Quiz(BaseModel):
     quiz_id: str
     user_id: str
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, HTTPException, Depends, Request, Query
+from app.config import settings
+from app.services.profiling import profiling_service, is_admin_request
+from app.services.vector_maintenance import vector_maintenance
+from starlette.concurrency import run_in_threadpool
+
+router = APIRouter()
+
+async def require_admin(request: Request):
+    """Dependency: admin endpoints are hidden unless ADMIN_TOKEN is set and presented"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin_request(request):
+        raise HTTPException(status_code=403, detail="Unauthorized")
+
+@router.post("/profile", dependencies=[Depends(require_admin)])
+async def profile_worker(
+    seconds: float = Query(10, gt=0),
+    output: str = Query("html", pattern="^(html|text)$")
+):
+    """Sample-profile this worker's event loop for a number of seconds"""
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {settings.PROFILE_MAX_SECONDS}")
+    return await profiling_service.profile_for(seconds, output)
+
+@router.get("/vector-store", dependencies=[Depends(require_admin)])
+async def vector_store_stats():
+    """Vector store size on disk, document count, worker RSS and the last compaction report"""
+    stats = await run_in_threadpool(vector_maintenance.stats)
+    return {**stats, "last_compaction": vector_maintenance.last_report}
+
+@router.post("/vector-store/compact", dependencies=[Depends(require_admin)])
+async def compact_vector_store(rebuild: bool = Query(None)):
+    """Apply retention now; rebuild=true forces an index rebuild, false skips it"""
+    return await run_in_threadpool(vector_maintenance.compact, rebuild)
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.services.auth_service import auth_service
+from app.services.storage_service import storage_service
 from typing import List, Dict
 
 router = APIRouter()
@@ -20,7 +21,7 @@ async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depend
 async def get_history(user_id: str = Depends(get_current_user_id)) -> List[Dict]:
     """Get user's quiz history"""
     try:
-        history = auth_service.get_user_history(user_id)
+        history = await storage_service.get_user_history(user_id)
         return history
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -29,7 +30,7 @@ async def get_history(user_id: str = Depends(get_current_user_id)) -> List[Dict]
 async def get_progress(user_id: str = Depends(get_current_user_id)) -> Dict:
     """Get user's progress analytics"""
     try:
-        analytics = auth_service.get_user_analytics(user_id)
+        analytics = await storage_service.get_user_analytics(user_id)
         return analytics
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -38,8 +39,8 @@ async def get_progress(user_id: str = Depends(get_current_user_id)) -> Dict:
 async def get_stats(user_id: str = Depends(get_current_user_id)) -> Dict:
     """Get detailed statistics"""
     try:
-        user_profile = auth_service.get_user_profile(user_id)
-        analytics = auth_service.get_user_analytics(user_id)
+        user_profile = await storage_service.get_user_profile(user_id)
+        analytics = await storage_service.get_user_analytics(user_id)
         
         return {
             "user": user_profile,
@@ -2,9 +2,13 @@ from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from firebase_admin import auth as firebase_auth
 from app.services.auth_service import auth_service
+from app.services.storage_service import storage_service
 from app.models.schemas import UserCreate, User
 from pydantic import BaseModel, EmailStr
 from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 security = HTTPBearer()
@@ -68,11 +72,11 @@ async def login(login_data: LoginRequest):
         email = decoded_token.get('email', '')
         
         # Get or create user profile
-        user_profile = auth_service.get_user_profile(uid)
+        user_profile = await storage_service.get_user_profile(uid)
         
         if not user_profile:
             # Create new profile
-            user_profile = auth_service.create_user_profile(
+            user_profile = await storage_service.create_user_profile(
                 uid=uid,
                 email=email,
                 full_name=decoded_token.get('name', email.split('@')[0])
@@ -109,7 +113,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             raise HTTPException(status_code=401, detail="Invalid token")
         
         uid = decoded_token['uid']
-        user_profile = auth_service.get_user_profile(uid)
+        user_profile = await storage_service.get_user_profile(uid)
         
         if not user_profile:
             raise HTTPException(status_code=404, detail="User not found")
@@ -147,13 +151,13 @@ async def register_direct(user_data: RegisterRequest):
             display_name=user_data.full_name
         )
         
-        print(f"✓ Created Firebase user: {firebase_user.uid}")
+        logger.info("Created Firebase user: %s", firebase_user.uid)
         
         # Create custom token
         custom_token = firebase_auth.create_custom_token(firebase_user.uid)
         
         # Create user profile in database
-        user_profile = auth_service.create_user_profile(
+        user_profile = await storage_service.create_user_profile(
             uid=firebase_user.uid,
             email=user_data.email,
             full_name=user_data.full_name
@@ -165,7 +169,7 @@ async def register_direct(user_data: RegisterRequest):
             expires_delta=timedelta(minutes=30)
         )
         
-        print(f"✓ User registered successfully: {user_data.email}")
+        logger.info("User registered successfully", extra={"uid": firebase_user.uid})
         
         return {
             "message": "User registered successfully",
@@ -185,7 +189,7 @@ async def register_direct(user_data: RegisterRequest):
             detail="Email already registered. Use /login-email endpoint to login."
         )
     except Exception as e:
-        print(f"❌ Registration error: {str(e)}")
+        logger.exception("Registration error: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Registration failed: {str(e)}"
@@ -209,18 +213,18 @@ async def login_with_email(credentials: EmailLoginRequest):
         # Get user by email from Firebase
         firebase_user = firebase_auth.get_user_by_email(credentials.email)
         
-        print(f"✓ Found user: {credentials.email}")
+        logger.debug("Found user", extra={"uid": firebase_user.uid})
         
         # Create custom token (bypasses password verification)
         # Note: In production, use Firebase REST API to verify password
         custom_token = firebase_auth.create_custom_token(firebase_user.uid)
         
         # Get user profile
-        user_profile = auth_service.get_user_profile(firebase_user.uid)
+        user_profile = await storage_service.get_user_profile(firebase_user.uid)
         
         if not user_profile:
             # Create profile if doesn't exist
-            user_profile = auth_service.create_user_profile(
+            user_profile = await storage_service.create_user_profile(
                 uid=firebase_user.uid,
                 email=credentials.email,
                 full_name=firebase_user.display_name or "User"
@@ -232,7 +236,7 @@ async def login_with_email(credentials: EmailLoginRequest):
             expires_delta=timedelta(minutes=30)
         )
         
-        print(f"✓ Login successful: {credentials.email}")
+        logger.info("Login successful", extra={"uid": firebase_user.uid})
         
         return {
             "message": "Login successful",
@@ -248,7 +252,7 @@ async def login_with_email(credentials: EmailLoginRequest):
             detail="User not found. Please register first using /register-direct endpoint."
         )
     except Exception as e:
-        print(f"❌ Login error: {str(e)}")
+        logger.exception("Login error: %s", e)
         raise HTTPException(
             status_code=401,
             detail=f"Authentication failed: {str(e)}"
@@ -273,7 +277,7 @@ async def delete_test_user(email: str):
         # Delete from Firebase
         firebase_auth.delete_user(firebase_user.uid)
         
-        print(f"✓ Deleted test user: {email}")
+        logger.info("Deleted test user", extra={"uid": firebase_user.uid})
         
         return {
             "message": f"User {email} deleted successfully",
@@ -283,5 +287,5 @@ async def delete_test_user(email: str):
     except firebase_auth.UserNotFoundError:
         raise HTTPException(status_code=404, detail="User not found")
     except Exception as e:
-        print(f"❌ Delete error: {str(e)}")
+        logger.exception("Delete error: %s", e)
         raise HTTPException(status_code=500, detail=f"Failed to delete user: {str(e)}")
\ No newline at end of file
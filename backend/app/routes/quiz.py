@@ -1,10 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, File, Form, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from starlette.concurrency import run_in_threadpool
 from app.services.auth_service import auth_service
+from app.services.storage_service import storage_service
 from app.services.quiz_generator import quiz_generator
-from app.models.schemas import QuizGenerate, Quiz, Question
-from typing import Dict, List, Any
-from datetime import datetime
+from app.services.job_queue import job_queue
+from app.models.schemas import QuizGenerate, QuizBatchGenerate, Quiz, QuizSubmission
+from app.config import settings
+from app.utils.email_parser import EmailParser
+from app.utils.helpers import sanitize_email_content
+from typing import Literal
+import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 security = HTTPBearer()
@@ -24,83 +34,194 @@ async def get_current_user_id(
 @router.post("/generate")
 async def generate_quiz(
     quiz_data: QuizGenerate,
+    mode: Literal["sync", "async"] = "sync",
     user_id: str = Depends(get_current_user_id)
 ):
-    """Generate quiz from donor email"""
+    """Generate quiz from donor email
+    
+    With ?mode=async the request is queued and a job id is returned
+    immediately; poll GET /jobs/{job_id} for the quiz.
+    """
     try:
+        if mode == "async":
+            job_id = await job_queue.enqueue(user_id, quiz_data.model_dump())
+            return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+        
         quiz = await quiz_generator.generate_quiz(
             user_id=user_id,
             email_content=quiz_data.donor_email,
             num_questions=quiz_data.num_questions
         )
+        await storage_service.save_quiz(quiz.model_dump(mode="json"))
         return quiz
     except Exception as e:
-        print(f"Error generating quiz: {str(e)}")
+        logger.exception("Error generating quiz: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error generating quiz: {str(e)}"
         )
 
+def _read_upload(upload: UploadFile) -> dict:
+    """Read and parse an uploaded email; runs in the threadpool"""
+    upload.file.seek(0)
+    return EmailParser.parse_upload(upload.file.read(), upload.filename or '', upload.content_type or '')
+
+@router.post("/generate-upload")
+async def generate_quiz_from_upload(
+    file: UploadFile = File(...),
+    num_questions: int = Form(5),
+    mode: Literal["sync", "async"] = "sync",
+    user_id: str = Depends(get_current_user_id)
+):
+    """Generate quiz from an uploaded .eml or HTML donor email
+    
+    The upload is spooled to a temporary file as it arrives (in memory up to
+    1 MB, then on disk) and parsed in the threadpool, so large newsletters
+    never pass through the event loop as one JSON string. Requests whose
+    Content-Length is over the limit are refused by middleware before the
+    body is read; the size check here catches chunked uploads. mode=async
+    works as for /generate.
+    """
+    try:
+        if file.size is not None and file.size > settings.UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"File larger than {settings.UPLOAD_MAX_BYTES} bytes")
+        
+        try:
+            parsed = await run_in_threadpool(_read_upload, file)
+        except ValueError as e:
+            raise HTTPException(status_code=415, detail=str(e))
+        
+        email_content = sanitize_email_content(parsed['content'])
+        if not email_content:
+            raise HTTPException(status_code=422, detail="No text content found in the uploaded email")
+        logger.info("Parsed uploaded email", extra={
+            "upload_bytes": file.size, "content_chars": len(email_content), "is_html": parsed.get('is_html', False)
+        })
+        
+        quiz_data = QuizGenerate(donor_email=email_content, num_questions=num_questions)
+        if mode == "async":
+            job_id = await job_queue.enqueue(user_id, quiz_data.model_dump())
+            return JSONResponse(status_code=202, content={"job_id": job_id, "status": "queued"})
+        
+        quiz = await quiz_generator.generate_quiz(
+            user_id=user_id,
+            email_content=quiz_data.donor_email,
+            num_questions=quiz_data.num_questions
+        )
+        await storage_service.save_quiz(quiz.model_dump(mode="json"))
+        return quiz
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error generating quiz from upload: %s", e)
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error generating quiz: {str(e)}"
+        )
+    finally:
+        await file.close()
+
+@router.post("/generate-batch")
+async def generate_quiz_batch(
+    batch_data: QuizBatchGenerate,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Generate quizzes for many donor emails
+    
+    Streams newline-delimited JSON: one "quiz" or "error" event per distinct
+    email as it finishes, then a "done" event listing every quiz.
+    """
+    if not batch_data.donor_emails:
+        raise HTTPException(status_code=400, detail="donor_emails must not be empty")
+    if len(batch_data.donor_emails) > settings.BATCH_MAX_EMAILS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_MAX_EMAILS} emails per batch"
+        )
+    
+    async def stream():
+        quizzes = []
+        async for event in quiz_generator.generate_batch(
+            user_id=user_id,
+            emails=batch_data.donor_emails,
+            num_questions=batch_data.num_questions
+        ):
+            if event["event"] == "quiz":
+                quiz = event["quiz"].model_dump(mode="json")
+                await storage_service.save_quiz(quiz)
+                event["quiz"] = quiz
+                quizzes.append({"email_indices": event["email_indices"], "quiz": quiz})
+            yield json.dumps(event) + "\n"
+        yield json.dumps({"event": "done", "total": len(quizzes), "quizzes": quizzes}) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@router.get("/jobs/{job_id}")
+async def get_generation_job(
+    job_id: str,
+    wait: float = 0,
+    user_id: str = Depends(get_current_user_id)
+):
+    """Get a quiz generation job; wait > 0 long-polls (max 30s) until it finishes"""
+    job = await job_queue.get_job(job_id, wait=min(max(wait, 0), 30))
+    
+    if not job or job['user_id'] != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return {
+        "job_id": job['job_id'],
+        "status": job['status'],
+        "quiz": job['result'],
+        "error": job['error'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at']
+    }
+
 @router.post("/evaluate")
 async def evaluate_quiz(
-    payload: Dict[str, Any],
+    submission: QuizSubmission,
     user_id: str = Depends(get_current_user_id)
 ):
-    """Evaluate quiz submission"""
+    """Evaluate quiz submission against the server-side copy of the quiz"""
     try:
-        # Extract quiz and answers from payload
-        quiz_data = payload.get("quiz")
-        answers_data = payload.get("answers", [])
-
-        print(f"Received quiz_id: {quiz_data.get('quiz_id')}")
-        print(f"Number of answers: {len(answers_data)}")
+        logger.debug("Evaluating quiz %s with %d answers", submission.quiz_id, len(submission.answers))
 
+        quiz_data = await storage_service.get_quiz(submission.quiz_id)
         if not quiz_data:
-            raise HTTPException(status_code=400, detail="Quiz data is required")
-
-        # Reconstruct Quiz object
-        questions = [Question(**q) for q in quiz_data.get("questions", [])]
-        
-        # Handle created_at as either string or datetime
-        created_at = quiz_data.get("created_at")
-        if isinstance(created_at, str):
-            try:
-                created_at = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-            except:
-                created_at = datetime.now()
-        
-        quiz = Quiz(
-            quiz_id=quiz_data.get("quiz_id"),
-            user_id=quiz_data.get("user_id"),
-            email_context=quiz_data.get("email_context"),
-            questions=questions,
-            created_at=created_at
-        )
+            raise HTTPException(status_code=404, detail="Quiz not found, expired or already submitted")
 
         # Verify quiz belongs to user
-        if quiz.user_id != user_id:
+        if quiz_data['user_id'] != user_id:
             raise HTTPException(status_code=403, detail="Unauthorized")
 
-        # Evaluate the quiz
-        result = await quiz_generator.evaluate_quiz(
-            quiz=quiz,
-            user_answers=answers_data
-        )
+        # Claim before the slow evaluation so concurrent submissions can't both be scored
+        quiz_data = await storage_service.claim_quiz(submission.quiz_id, user_id)
+        if not quiz_data:
+            raise HTTPException(status_code=409, detail="Quiz already submitted")
+
+        quiz = Quiz(**quiz_data)
+        try:
+            # Evaluate the quiz
+            result = await quiz_generator.evaluate_quiz(
+                quiz=quiz,
+                user_answers=[answer.model_dump() for answer in submission.answers]
+            )
 
-        # Save result to Firebase
-        result_dict = result.dict()
-        result_dict['completed_at'] = result_dict['completed_at'].isoformat()
-        auth_service.save_quiz_result(user_id, result_dict)
+            # Save result to the configured storage backend
+            result_dict = result.dict()
+            result_dict['completed_at'] = result_dict['completed_at'].isoformat()
+            await storage_service.save_quiz_result(user_id, result_dict)
+        except Exception:
+            await storage_service.release_quiz(submission.quiz_id)
+            raise
 
         return result
 
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Error evaluating quiz: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error evaluating quiz: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Error evaluating quiz: {str(e)}"
-        )
\ No newline at end of file
+        )
@@ -1,25 +1,33 @@
 import firebase_admin
 from firebase_admin import credentials, auth, db
 from app.config import settings
+from app.utils.helpers import utc_timestamp
 from typing import Optional, Dict
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+import logging
 
-# Initialize Firebase
-cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
-firebase_admin.initialize_app(cred, {
-    'databaseURL': settings.FIREBASE_DATABASE_URL
-})
+logger = logging.getLogger(__name__)
+
+# Initialize Firebase (skipped when tokens are our own JWTs, e.g. offline load tests)
+if settings.AUTH_PROVIDER == "firebase":
+    cred = credentials.Certificate(settings.FIREBASE_CREDENTIALS_PATH)
+    firebase_admin.initialize_app(cred, {
+        'databaseURL': settings.FIREBASE_DATABASE_URL
+    })
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 class AuthService:
     def __init__(self):
-        self.db = db.reference()
+        self.db = db.reference() if settings.AUTH_PROVIDER == "firebase" else None
     
     def verify_firebase_token(self, id_token: str) -> Optional[Dict]:
         """Verify Firebase ID token with clock skew tolerance"""
+        if settings.AUTH_PROVIDER == "local":
+            return self.verify_access_token(id_token)
+        
         try:
             # Add 5 seconds of clock skew tolerance to handle system clock drift
             decoded_token = auth.verify_id_token(
@@ -28,14 +36,29 @@ class AuthService:
             )
             return decoded_token
         except auth.ExpiredIdTokenError:
-            print("Token verification error: Token has expired")
+            logger.info("Token verification error: Token has expired")
             return None
         except auth.InvalidIdTokenError as e:
-            print(f"Token verification error: Invalid token - {str(e)}")
+            logger.info("Token verification error: Invalid token - %s", e)
             return None
         except Exception as e:
-            print(f"Token verification error: {e}")
+            logger.warning("Token verification error: %s", e)
+            return None
+    
+    def verify_access_token(self, token: str) -> Optional[Dict]:
+        """Verify a JWT issued by create_access_token, shaped like a decoded Firebase token"""
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        except JWTError as e:
+            logger.info("Token verification error: %s", e)
+            return None
+        
+        if not payload.get('sub'):
             return None
+        decoded = {'uid': payload['sub'], 'email': payload.get('email', '')}
+        if payload.get('name'):
+            decoded['name'] = payload['name']
+        return decoded
     
     def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None):
         """Create JWT access token"""
@@ -52,7 +75,10 @@ class AuthService:
     def get_user_profile(self, uid: str) -> Optional[Dict]:
         """Get user profile from Firebase Realtime Database"""
         user_ref = self.db.child('users').child(uid)
-        return user_ref.get()
+        user_data = user_ref.get()
+        if user_data:
+            user_data['average_score'] = self._average_score(user_data)
+        return user_data
     
     def create_user_profile(self, uid: str, email: str, full_name: str) -> Dict:
         """Create user profile in Firebase"""
@@ -60,7 +86,7 @@ class AuthService:
             'uid': uid,
             'email': email,
             'full_name': full_name,
-            'created_at': datetime.now().isoformat(),
+            'created_at': utc_timestamp(),
             'total_quizzes': 0,
             'total_score': 0.0
         }
@@ -69,28 +95,76 @@ class AuthService:
         user_ref.set(user_data)
         return user_data
     
-    def save_quiz_result(self, user_id: str, quiz_result: Dict):
-        """Save quiz result to Firebase"""
-        quiz_id = quiz_result['quiz_id']
+    def save_quiz(self, quiz: Dict):
+        """Store a generated quiz so it can be evaluated by quiz_id"""
+        self.db.child('quizzes').child(quiz['quiz_id']).set(quiz)
+    
+    def get_quiz(self, quiz_id: str) -> Optional[Dict]:
+        """Get a stored, not yet submitted quiz"""
+        return self.db.child('quizzes').child(quiz_id).get()
+    
+    def claim_quiz(self, quiz_id: str, user_id: str, not_before: Optional[str] = None) -> Optional[Dict]:
+        """Atomically mark a stored quiz as being evaluated
         
-        # Save to user's history
-        history_ref = self.db.child('quiz_history').child(user_id).child(quiz_id)
-        history_ref.set(quiz_result)
+        Runs as a Realtime Database transaction, so of two concurrent
+        submissions only one sees the quiz unclaimed. Returns the quiz, or None
+        if it is missing, another user's, created before not_before (expired)
+        or already claimed.
+        """
+        claimed = {}
         
-        # Update user stats
-        user_ref = self.db.child('users').child(user_id)
-        user_data = user_ref.get() or {}
+        def claim(current):
+            claimed.clear()
+            if (not current or current.get('user_id') != user_id or current.get('claimed_at')
+                    or (not_before and str(current.get('created_at', '')) < not_before)):
+                return current
+            claimed.update(current)
+            return {**current, 'claimed_at': utc_timestamp()}
         
-        total_quizzes = user_data.get('total_quizzes', 0) + 1
-        total_score = user_data.get('total_score', 0.0) + quiz_result['score']
+        self.db.child('quizzes').child(quiz_id).transaction(claim)
+        return claimed or None
+    
+    def release_quiz(self, quiz_id: str):
+        """Undo claim_quiz after a failed evaluation so the quiz can be resubmitted"""
+        self.db.child('quizzes').child(quiz_id).child('claimed_at').delete()
+    
+    def purge_expired_quizzes(self, not_before: str) -> int:
+        """Delete stored quizzes created before not_before; needs ".indexOn": "created_at" on quizzes"""
+        expired = self.db.child('quizzes').order_by_child('created_at').end_at(not_before).get() or {}
+        if expired:
+            self.db.update({f'quizzes/{quiz_id}': None for quiz_id in expired})
+        return len(expired)
+    
+    def save_quiz_result(self, user_id: str, quiz_result: Dict):
+        """Save quiz result to Firebase
         
-        user_ref.update({
-            'total_quizzes': total_quizzes,
-            'total_score': total_score,
-            'average_score': total_score / total_quizzes,
-            'last_quiz_date': datetime.now().isoformat()
+        History insert, stat update and removal of the stored quiz go out as
+        a single multi-path update, with the counters bumped server-side so
+        concurrent submissions for the same user never overwrite each other.
+        """
+        quiz_id = quiz_result['quiz_id']
+        
+        self.db.update({
+            f'quiz_history/{user_id}/{quiz_id}': quiz_result,
+            f'quizzes/{quiz_id}': None,
+            f'users/{user_id}/total_quizzes': self._increment(1),
+            f'users/{user_id}/total_score': self._increment(quiz_result['score']),
+            f'users/{user_id}/last_quiz_date': utc_timestamp()
         })
     
+    @staticmethod
+    def _increment(delta: float) -> Dict:
+        """Realtime Database server value that atomically adds delta"""
+        return {'.sv': {'increment': delta}}
+    
+    @staticmethod
+    def _average_score(user_data: Dict) -> float:
+        """Derive average score from the atomically maintained totals"""
+        total_quizzes = user_data.get('total_quizzes', 0)
+        if not total_quizzes:
+            return 0.0
+        return user_data.get('total_score', 0.0) / total_quizzes
+    
     def get_user_history(self, user_id: str) -> list:
         """Get user's quiz history"""
         history_ref = self.db.child('quiz_history').child(user_id)
@@ -134,7 +208,7 @@ class AuthService:
         
         return {
             'total_quizzes': total_quizzes,
-            'average_score': user_data.get('average_score', 0),
+            'average_score': self._average_score(user_data),
             'total_questions_answered': total_questions,
             'accuracy_rate': accuracy_rate,
             'improvement_trend': improvement_trend,
@@ -0,0 +1,233 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from app.config import settings
+from app.models.database import SessionLocal, db_service
+from app.services.vector_db import vector_db
+from app.utils.email_parser import EmailParser
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from datetime import datetime
+from itertools import islice
+import hashlib
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Where to resume a source: byte offset into an mbox, file name within a maildir
+Position = Union[int, str]
+
+def iter_mbox(path: str, start: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """Stream (end offset, raw message) pairs from an mbox file
+
+    Reads line by line, so memory holds one message at a time. Messages are
+    split on "From " lines, like the standard library's mailbox.mbox; the
+    end offset is where the next message starts, so it doubles as the
+    resume position.
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        offset = start
+        lines: List[bytes] = []
+        in_message = False
+        for line in f:
+            if line.startswith(b'From '):
+                if in_message:
+                    yield offset, b''.join(lines)
+                lines = []
+                in_message = True
+            elif in_message:
+                lines.append(line)
+            offset += len(line)
+        if in_message:
+            yield offset, b''.join(lines)
+
+def iter_maildir(path: str, after: Optional[str] = None) -> Iterator[Tuple[str, bytes]]:
+    """Stream (file name, raw message) pairs from a maildir's new/ and cur/
+
+    Files are visited in name order (maildir names start with a delivery
+    timestamp), skipping names up to and including `after`.
+    """
+    entries = []
+    for sub in ('new', 'cur'):
+        directory = os.path.join(path, sub)
+        if os.path.isdir(directory):
+            entries.extend(
+                (entry.name, entry.path) for entry in os.scandir(directory)
+                if entry.is_file() and not entry.name.startswith('.')
+            )
+    entries.sort()
+
+    for name, file_path in entries:
+        if after is not None and name <= after:
+            continue
+        with open(file_path, 'rb') as f:
+            yield name, f.read()
+
+def iter_messages(source: str, position: Optional[Position] = None) -> Iterator[Tuple[Position, bytes]]:
+    """Messages from an mbox file or a maildir directory, from a resume position"""
+    if os.path.isdir(source):
+        if not any(os.path.isdir(os.path.join(source, sub)) for sub in ('cur', 'new')):
+            raise ValueError(f"{source} is not a maildir (no cur/ or new/)")
+        return iter_maildir(source, after=position)
+    return iter_mbox(source, start=position or 0)
+
+def _batched(items: Iterator, size: int) -> Iterator[list]:
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+class EmailIngestPipeline:
+    """Bulk import of donor correspondence from mbox files and maildirs
+
+    Messages stream from disk in batches; each batch is parsed in a process
+    pool while the previous one is stored (DonorEmail rows plus one batched
+    embedding and vector insert). A checkpoint is written after every stored
+    batch, and storing is idempotent, so an interrupted import resumes where
+    it stopped without duplicating anything.
+    """
+
+    def __init__(self, user_id: str, workers: Optional[int] = None,
+                 batch_size: Optional[int] = None, checkpoint_dir: Optional[str] = None):
+        self.user_id = user_id
+        self.workers = (workers if workers is not None else settings.INGEST_WORKERS) or os.cpu_count() or 1
+        self.batch_size = batch_size or settings.INGEST_BATCH_SIZE
+        self.checkpoint_dir = checkpoint_dir or settings.INGEST_CHECKPOINT_DIR
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+
+    # ============================================
+    # CHECKPOINTS
+    # ============================================
+
+    def _checkpoint_path(self, source: str) -> str:
+        key = hashlib.sha256(f"{self.user_id}\0{os.path.abspath(source)}".encode()).hexdigest()[:16]
+        return os.path.join(self.checkpoint_dir, f"{key}.json")
+
+    def load_checkpoint(self, source: str) -> Optional[Dict]:
+        """Progress saved by an earlier run over this source, if any"""
+        try:
+            with open(self._checkpoint_path(source)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save_checkpoint(self, source: str, state: Dict):
+        path = self._checkpoint_path(source)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({**state, 'updated_at': datetime.now().isoformat()}, f)
+        os.replace(tmp_path, path)
+
+    # ============================================
+    # PIPELINE
+    # ============================================
+
+    def _email_id(self, digest: str) -> str:
+        # Per-user, so two users importing the same archive each get their rows
+        return hashlib.sha256(f"{self.user_id}\0{digest}".encode()).hexdigest()
+
+    def _store(self, parsed: List[Optional[Dict]], state: Dict):
+        """Write one parsed batch to the database and the vector store"""
+        batch: Dict[str, Dict] = {}
+        stored = 0
+        for message in parsed:
+            if message is None:
+                state['failed'] += 1
+            elif not message['content']:
+                state['skipped'] += 1
+            else:
+                stored += 1
+                batch.setdefault(self._email_id(message['digest']), message)
+
+        rows = [
+            {
+                'email_id': email_id,
+                'user_id': self.user_id,
+                'subject': message['subject'][:500],
+                'sender': message['sender'][:255],
+                'content': message['content'],
+                'category': message['key_info']['category'],
+                'vector_db_id': email_id
+            }
+            for email_id, message in batch.items()
+        ]
+        with SessionLocal() as db:
+            inserted = db_service.save_donor_emails(db, rows)
+
+        created_at = datetime.now().isoformat()
+        vector_db.add_emails(
+            list(batch),
+            [message['content'] for message in batch.values()],
+            [
+                {
+                    'user_id': self.user_id,
+                    'subject': message['subject'],
+                    'sender': message['sender'],
+                    'date': message['date'],
+                    'created_at': created_at,
+                    'category': message['key_info']['category'],
+                    'topics': ','.join(message['key_info']['topics'])
+                }
+                for message in batch.values()
+            ]
+        )
+        state['inserted'] += inserted
+        state['duplicates'] += stored - inserted
+
+    def ingest(self, source: str, restart: bool = False) -> Dict:
+        """Import every message in an mbox file or maildir, resuming from its checkpoint
+
+        Returns counts: processed (messages read), inserted, duplicates
+        (already stored or repeated within the source), skipped (no text
+        content) and failed (unparseable).
+        """
+        checkpoint = None if restart else self.load_checkpoint(source)
+        state = checkpoint or {
+            'source': os.path.abspath(source),
+            'user_id': self.user_id,
+            'position': None,
+            'processed': 0,
+            'inserted': 0,
+            'duplicates': 0,
+            'skipped': 0,
+            'failed': 0
+        }
+        if checkpoint:
+            logger.info("Resuming import", extra={"source": source, "processed": state['processed']})
+
+        batches = _batched(iter_messages(source, state['position']), self.batch_size)
+        with (ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else nullcontext()) as pool:
+            # Double-buffered: batch N+1 is parsing in the pool while batch N is stored
+            pending = None
+            for batch in batches:
+                positions, raws = zip(*batch)
+                submitted = (positions[-1], len(raws), self._parse(pool, raws))
+                if pending:
+                    self._commit(source, pending, state)
+                pending = submitted
+            if pending:
+                self._commit(source, pending, state)
+
+        logger.info("Import finished", extra={"source": source, **{
+            k: state[k] for k in ('processed', 'inserted', 'duplicates', 'skipped', 'failed')
+        }})
+        return state
+
+    def _parse(self, pool: Optional[ProcessPoolExecutor], raws: Tuple[bytes, ...]) -> Iterator:
+        """Start parsing a batch; results are collected when the batch is committed"""
+        if pool is None:
+            return map(EmailParser.parse_for_ingest, raws)
+        chunksize = max(1, len(raws) // (self.workers * 4))
+        return pool.map(EmailParser.parse_for_ingest, raws, chunksize=chunksize)
+
+    def _commit(self, source: str, pending: Tuple[Position, int, Iterator], state: Dict):
+        position, count, results = pending
+        self._store(list(results), state)
+        state['processed'] += count
+        state['position'] = position
+        self._save_checkpoint(source, state)
+        logger.info("Imported batch", extra={
+            "source": source, "processed": state['processed'], "inserted": state['inserted']
+        })
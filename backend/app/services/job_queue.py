@@ -0,0 +1,260 @@
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from typing import Optional, Dict, List
+from datetime import datetime, timedelta, timezone
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class QuizJobQueue:
+    """SQLite-backed queue for background quiz generation
+
+    Jobs survive restarts: a running job renews its lease (heartbeat_at, UTC)
+    and one whose lease lapsed because its process died is re-queued, without
+    touching jobs another process sharing the file is still running. Finished
+    jobs are deleted after JOB_RETENTION_HOURS. A fixed pool of asyncio
+    workers drains the queue, so the number of in-flight generations is
+    bounded regardless of how many requests arrive at once.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        self.workers: List[asyncio.Task] = []
+        self.maintenance_task: Optional[asyncio.Task] = None
+        self.active: set = set()  # ids of jobs this process is running
+        self._wakeup: Optional[asyncio.Event] = None
+
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS quiz_jobs (
+                    job_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    heartbeat_at TEXT
+                )
+            """)
+            columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(quiz_jobs)")}
+            if 'heartbeat_at' not in columns:
+                self.conn.execute("ALTER TABLE quiz_jobs ADD COLUMN heartbeat_at TEXT")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_quiz_jobs_status_created ON quiz_jobs (status, created_at)"
+            )
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_quiz_jobs_status_updated ON quiz_jobs (status, updated_at)"
+            )
+
+    def _enqueue(self, user_id: str, payload: Dict) -> str:
+        job_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO quiz_jobs (job_id, user_id, status, payload, created_at, updated_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, user_id, json.dumps(payload), now, now)
+            )
+        return job_id
+
+    def _claim(self) -> Optional[Dict]:
+        """Atomically move the oldest queued job to running"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT * FROM quiz_jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row:
+                    self.conn.execute(
+                        "UPDATE quiz_jobs SET status = 'running', updated_at = ?, heartbeat_at = ? WHERE job_id = ?",
+                        (datetime.now().isoformat(), datetime.now(timezone.utc).isoformat(), row['job_id'])
+                    )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return self._row_to_dict(row) if row else None
+
+    def _finish(self, job_id: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE quiz_jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE job_id = ?",
+                (
+                    'failed' if error else 'completed',
+                    json.dumps(result) if result is not None else None,
+                    error,
+                    datetime.now().isoformat(),
+                    job_id
+                )
+            )
+
+    def _heartbeat(self, job_id: str):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE quiz_jobs SET heartbeat_at = ? WHERE job_id = ? AND status = 'running'",
+                (datetime.now(timezone.utc).isoformat(), job_id)
+            )
+
+    def _get(self, job_id: str) -> Optional[Dict]:
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM quiz_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def _requeue_stale(self) -> int:
+        """Re-queue running jobs whose lease lapsed (rows from before leases have none)"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=settings.JOB_LEASE_SECONDS)).isoformat()
+        with self.lock:
+            cursor = self.conn.execute(
+                "UPDATE quiz_jobs SET status = 'queued', updated_at = ?, heartbeat_at = NULL "
+                "WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (datetime.now().isoformat(), cutoff)
+            )
+        return cursor.rowcount
+
+    def _requeue(self, job_ids: List[str]):
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE quiz_jobs SET status = 'queued', updated_at = ?, heartbeat_at = NULL "
+                "WHERE job_id = ? AND status = 'running'",
+                [(datetime.now().isoformat(), job_id) for job_id in job_ids]
+            )
+
+    def _purge_finished(self) -> int:
+        """Delete completed and failed jobs older than JOB_RETENTION_HOURS"""
+        if not settings.JOB_RETENTION_HOURS:
+            return 0
+        cutoff = (datetime.now() - timedelta(hours=settings.JOB_RETENTION_HOURS)).isoformat()
+        with self.lock:
+            cursor = self.conn.execute(
+                "DELETE FROM quiz_jobs WHERE status IN ('completed', 'failed') AND updated_at < ?",
+                (cutoff,)
+            )
+        return cursor.rowcount
+
+    @staticmethod
+    def _row_to_dict(row) -> Dict:
+        return {
+            'job_id': row['job_id'],
+            'user_id': row['user_id'],
+            'status': row['status'],
+            'payload': json.loads(row['payload']),
+            'result': json.loads(row['result']) if row['result'] else None,
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at']
+        }
+
+    async def enqueue(self, user_id: str, payload: Dict) -> str:
+        """Queue a generation job and wake a worker"""
+        job_id = await run_in_threadpool(self._enqueue, user_id, payload)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get_job(self, job_id: str, wait: float = 0) -> Optional[Dict]:
+        """Get a job, optionally long-polling up to wait seconds for it to finish"""
+        deadline = asyncio.get_running_loop().time() + wait
+        while True:
+            job = await run_in_threadpool(self._get, job_id)
+            if not job or job['status'] in ('completed', 'failed'):
+                return job
+            if asyncio.get_running_loop().time() >= deadline:
+                return job
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+    async def _process(self, job: Dict):
+        # Imported lazily to avoid a cycle with modules that enqueue jobs
+        from app.services.quiz_generator import quiz_generator
+        from app.services.storage_service import storage_service
+
+        payload = job['payload']
+        self.active.add(job['job_id'])
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job['job_id']))
+        try:
+            quiz = await quiz_generator.generate_quiz(
+                user_id=job['user_id'],
+                email_content=payload['donor_email'],
+                num_questions=payload['num_questions']
+            )
+            quiz_dict = quiz.model_dump(mode="json")
+            await storage_service.save_quiz(quiz_dict)
+            await run_in_threadpool(self._finish, job['job_id'], quiz_dict)
+            logger.info("Job %s completed", job['job_id'])
+        except Exception as e:
+            logger.error("Job %s failed: %s", job['job_id'], e)
+            await run_in_threadpool(self._finish, job['job_id'], None, str(e))
+        finally:
+            heartbeat.cancel()
+            self.active.discard(job['job_id'])
+
+    async def _heartbeat_loop(self, job_id: str):
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS / 3)
+            try:
+                await run_in_threadpool(self._heartbeat, job_id)
+            except Exception as e:
+                logger.warning("Job %s heartbeat failed: %s", job_id, e)
+
+    async def _maintenance_loop(self):
+        while True:
+            await asyncio.sleep(settings.JOB_LEASE_SECONDS)
+            try:
+                requeued = await run_in_threadpool(self._requeue_stale)
+                if requeued:
+                    logger.warning("Re-queued %d job(s) with a lapsed lease", requeued)
+                    self._wakeup.set()
+                purged = await run_in_threadpool(self._purge_finished)
+                if purged:
+                    logger.info("Purged %d finished job(s)", purged)
+            except Exception as e:
+                logger.exception("Job queue maintenance failed: %s", e)
+
+    async def _worker(self):
+        while True:
+            job = await run_in_threadpool(self._claim)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL * 10)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(job)
+
+    async def start(self):
+        """Re-queue interrupted jobs, purge old ones and start the worker pool"""
+        self._wakeup = asyncio.Event()
+        requeued = await run_in_threadpool(self._requeue_stale)
+        if requeued:
+            logger.warning("Re-queued %d interrupted job(s)", requeued)
+        await run_in_threadpool(self._purge_finished)
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(settings.JOB_WORKERS)]
+        self.maintenance_task = asyncio.create_task(self._maintenance_loop())
+        logger.info("Started %d quiz generation worker(s)", settings.JOB_WORKERS)
+
+    async def stop(self):
+        """Cancel workers and re-queue the jobs they were running"""
+        interrupted = list(self.active)
+        tasks = self.workers + ([self.maintenance_task] if self.maintenance_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+        self.maintenance_task = None
+        if interrupted:
+            await run_in_threadpool(self._requeue, interrupted)
+
+job_queue = QuizJobQueue(settings.JOB_QUEUE_PATH)
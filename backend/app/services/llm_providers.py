@@ -0,0 +1,172 @@
+from abc import ABC, abstractmethod
+from app.config import settings
+from typing import Optional
+import json
+import math
+import random
+import re
+import threading
+import time
+
+class LLMProvider(ABC):
+    """Backend that turns a prompt into completion text"""
+
+    name = "base"
+
+    @abstractmethod
+    def generate(
+        self,
+        prompt: str,
+        system_prompt: str = "",
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        cached_content: Optional[str] = None,
+        response_schema=None
+    ) -> Optional[str]:
+        """Return completion text, or None/empty for an empty response"""
+
+    def create_cache(self, system_prompt: str, ttl: int) -> str:
+        """Create a context cache for system_prompt and return its name"""
+        raise NotImplementedError(f"{self.name} provider does not support context caching")
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini via the google.genai package"""
+
+    name = "gemini"
+
+    def __init__(self):
+        from google import genai
+        from google.genai import types
+        self.types = types
+        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
+        self.model = settings.LLM_MODEL
+
+    def generate(
+        self,
+        prompt: str,
+        system_prompt: str = "",
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        cached_content: Optional[str] = None,
+        response_schema=None
+    ) -> Optional[str]:
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=self.types.GenerateContentConfig(
+                temperature=temperature,
+                max_output_tokens=max_tokens,
+                system_instruction=None if cached_content else (system_prompt or None),
+                cached_content=cached_content,
+                response_mime_type="application/json" if response_schema else None,
+                response_schema=response_schema,
+            )
+        )
+        return response.text
+
+    def create_cache(self, system_prompt: str, ttl: int) -> str:
+        cache = self.client.caches.create(
+            model=self.model,
+            config=self.types.CreateCachedContentConfig(
+                system_instruction=system_prompt,
+                ttl=f"{ttl}s"
+            )
+        )
+        return cache.name
+
+
+class FakeLLMProvider(LLMProvider):
+    """Deterministic offline stand-in for load testing
+
+    Returns canned quiz JSON for question-generation prompts and canned prose
+    otherwise, after a sampled latency. Configured error rates raise the same
+    kinds of messages Gemini does (429 / 500) so retry and fallback paths run.
+    """
+
+    name = "fake"
+
+    _QUESTION_COUNT = re.compile(r'EXACTLY (\d+) multiple-choice')
+    _DIFFICULTIES = ["easy", "medium", "hard"]
+
+    def __init__(self):
+        self.random = random.Random(settings.FAKE_LLM_SEED)
+        self.lock = threading.Lock()
+
+    def _sample_latency(self) -> float:
+        """Seconds to wait, from FAKE_LLM_LATENCY_DISTRIBUTION"""
+        mean = settings.FAKE_LLM_LATENCY_MS / 1000
+        stddev = settings.FAKE_LLM_LATENCY_STDDEV_MS / 1000
+        distribution = settings.FAKE_LLM_LATENCY_DISTRIBUTION
+        with self.lock:
+            if distribution == "fixed" or stddev <= 0 or mean <= 0:
+                return max(mean, 0.0)
+            if distribution == "normal":
+                return max(self.random.gauss(mean, stddev), 0.0)
+            if distribution == "lognormal":
+                sigma2 = math.log(1 + (stddev / mean) ** 2)
+                return self.random.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+        raise ValueError(f"Unknown latency distribution: {distribution}")
+
+    def _roll(self) -> float:
+        with self.lock:
+            return self.random.random()
+
+    @classmethod
+    def canned_questions(cls, num_questions: int) -> dict:
+        return {
+            "questions": [
+                {
+                    "id": f"q{i + 1}",
+                    "question_text": f"Load-test question {i + 1}: which practice best strengthens donor stewardship?",
+                    "options": [
+                        "A) Prompt, personal acknowledgment of each gift",
+                        "B) Waiting until year-end to say thank you",
+                        "C) Only contacting donors to ask for more",
+                        "D) Omitting how gifts were used"
+                    ],
+                    "correct_answer": "A",
+                    "explanation": "Timely, personal acknowledgment builds trust and encourages repeat giving. The other options weaken the donor relationship.",
+                    "difficulty": cls._DIFFICULTIES[i % len(cls._DIFFICULTIES)]
+                }
+                for i in range(num_questions)
+            ]
+        }
+
+    def generate(
+        self,
+        prompt: str,
+        system_prompt: str = "",
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        cached_content: Optional[str] = None,
+        response_schema=None
+    ) -> Optional[str]:
+        time.sleep(self._sample_latency())
+
+        roll = self._roll()
+        if roll < settings.FAKE_LLM_RATE_LIMIT_RATE:
+            raise Exception("429 RESOURCE_EXHAUSTED: fake quota exceeded")
+        roll -= settings.FAKE_LLM_RATE_LIMIT_RATE
+        if roll < settings.FAKE_LLM_SERVER_ERROR_RATE:
+            raise Exception("500 INTERNAL: fake server error")
+        roll -= settings.FAKE_LLM_SERVER_ERROR_RATE
+        if roll < settings.FAKE_LLM_EMPTY_RATE:
+            return ""
+
+        match = self._QUESTION_COUNT.search(prompt)
+        if match:
+            return json.dumps(self.canned_questions(int(match.group(1))))
+        return (
+            "This is a canned response from the fake LLM provider. "
+            "It stands in for explanations and summaries during load tests."
+        )
+
+
+def create_llm_provider(provider: str) -> LLMProvider:
+    """Create the LLM provider selected by LLM_PROVIDER"""
+    if provider == "gemini":
+        return GeminiProvider()
+    elif provider == "fake":
+        return FakeLLMProvider()
+    raise ValueError(f"Unknown LLM provider: {provider}")
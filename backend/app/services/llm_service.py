@@ -1,18 +1,110 @@
-from google import genai
-from google.genai import types
 from app.config import settings
-from typing import List, Dict
+from app.services.llm_providers import create_llm_provider
+from app.utils.helpers import hash_text, truncate_to_token_budget, estimate_tokens
+from app.models.schemas import QuestionSet
+from app.services.metrics import LLM_LATENCY, LLM_RETRIES, LLM_FALLBACKS, LLM_TOKENS, LLM_PARSES
+from app.services.tracing import span
+from pydantic import ValidationError
+from typing import List, Dict, Optional
+import asyncio
 import json
+import logging
+import threading
 import time
 import random
 import re
 
+logger = logging.getLogger(__name__)
+
+QUIZ_SYSTEM_PROMPT = """You are an expert educational assessment designer specializing in non-profit management, donor relations, and fundraising.
+
+Your task is to create challenging, thought-provoking multiple-choice questions that test deep understanding, not just recall.
+
+CRITICAL RULES:
+1. Return ONLY valid JSON - no markdown, no code blocks, no explanations
+2. Questions must be clear, specific, and challenging
+3. Explanations must be detailed and educational
+4. Focus on non-profit best practices and ethics
+5. Use simple, direct language
+6. Ensure all strings are properly closed"""
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
 class LLMService:
     def __init__(self):
-        """Initialize Gemini AI service"""
-        # Configure with new package
-        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
-        print("✓ Gemini AI service initialized with google.genai package")
+        """Initialize LLM service with the configured provider"""
+        self.provider = create_llm_provider(settings.LLM_PROVIDER)
+        # Caps concurrent Gemini calls across request threads and job workers
+        self.concurrency = threading.BoundedSemaphore(settings.LLM_MAX_CONCURRENCY)
+        # Spaces calls evenly to stay under LLM_REQUESTS_PER_MINUTE
+        self._rate_lock = threading.Lock()
+        self._next_call_at = 0.0
+        # Gemini context caches for static system prompts: prompt hash -> (name, expires_at)
+        self._context_caches: Dict[str, tuple] = {}
+        self._cache_lock = threading.Lock()
+        # Question parse outcomes, to compare structured vs free-text output
+        self.parse_stats = {
+            "structured": {"success": 0, "failure": 0},
+            "freetext": {"success": 0, "failure": 0}
+        }
+        self._stats_lock = threading.Lock()
+        logger.info("LLM service initialized", extra={"provider": self.provider.name})
+    
+    def _wait_for_rate_slot(self):
+        """Block until the next request slot allowed by the per-minute quota
+        
+        Only call from worker threads (run_in_threadpool, job workers). On the
+        event loop the sleep would stall every request, so it is skipped there
+        with a warning and the call relies on the 429 backoff instead.
+        """
+        if settings.LLM_REQUESTS_PER_MINUTE <= 0:
+            return
+        interval = 60.0 / settings.LLM_REQUESTS_PER_MINUTE
+        on_event_loop = _on_event_loop()
+        with self._rate_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_call_at)
+            # An unpaced call doesn't take the future slot it would have waited for
+            if not (slot > now and on_event_loop):
+                self._next_call_at = slot + interval
+        if slot > now:
+            if on_event_loop:
+                logger.warning("LLM call made on the event loop; skipping %.2fs of rate pacing", slot - now)
+                return
+            time.sleep(slot - now)
+    
+    def _cached_content(self, system_prompt: str) -> Optional[str]:
+        """Name of a provider context cache holding system_prompt, if caching is enabled
+        
+        Gemini rejects caches below its minimum token count; in that case (or
+        on any other error) None is returned and the prompt is sent inline.
+        """
+        if not settings.LLM_CONTEXT_CACHE or not system_prompt:
+            return None
+        
+        key = hash_text(system_prompt)
+        with self._cache_lock:
+            cached = self._context_caches.get(key)
+            if cached and (cached[1] is None or cached[1] > time.monotonic()):
+                return cached[0]
+            
+            ttl = settings.LLM_CONTEXT_CACHE_TTL
+            try:
+                cache_name = self.provider.create_cache(system_prompt, ttl)
+                # Refresh a minute early so requests never reference an expired cache
+                self._context_caches[key] = (cache_name, time.monotonic() + ttl - 60)
+                logger.info("Created context cache for system prompt (~%d tokens)", estimate_tokens(system_prompt))
+                return cache_name
+            except Exception as e:
+                logger.warning("Context cache unavailable, sending system prompt inline: %s", e)
+                # Don't retry creation on every call
+                self._context_caches[key] = (None, None)
+                return None
     
     def generate_completion(
         self,
@@ -21,60 +113,85 @@ class LLMService:
         temperature: float = 0.7,
         max_tokens: int = 2000,
         retry_count: int = 3,
-        backoff_factor: float = 2.0
+        backoff_factor: float = 2.0,
+        response_schema=None,
+        call_type: str = "generate"
     ) -> str:
-        """Generate completion using Gemini with exponential backoff retry logic"""
+        """Generate completion with exponential backoff retry logic
         
-        # Combine prompts
-        full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+        With response_schema (a pydantic model) the provider is asked for JSON
+        that conforms to it, and the JSON text is returned. call_type labels
+        the call in metrics (generate/evaluate/summary).
+        """
+        
+        # Static instructions go in system_instruction (or a context cache)
+        cached_content = self._cached_content(system_prompt)
+        prompt_tokens = estimate_tokens(prompt) + (0 if cached_content else estimate_tokens(system_prompt))
         
         for attempt in range(retry_count):
             try:
-                print(f"🤖 Generating completion (attempt {attempt + 1}/{retry_count})...")
+                logger.debug("Generating completion (attempt %d/%d)", attempt + 1, retry_count, extra={"call_type": call_type})
                 
-                # Use new API
-                response = self.client.models.generate_content(
-                    model='gemini-2.5-flash',
-                    contents=full_prompt,
-                    config=types.GenerateContentConfig(
-                        temperature=temperature,
-                        max_output_tokens=max_tokens,
-                    )
-                )
+                self._wait_for_rate_slot()
+                with self.concurrency, span("llm.call", call_type=call_type, attempt=attempt + 1) as call_span:
+                    started = time.perf_counter()
+                    try:
+                        text = self.provider.generate(
+                            prompt=prompt,
+                            system_prompt=system_prompt,
+                            temperature=temperature,
+                            max_tokens=max_tokens,
+                            cached_content=cached_content,
+                            response_schema=response_schema
+                        )
+                    except Exception:
+                        LLM_LATENCY.labels(call_type=call_type, outcome="error").observe(time.perf_counter() - started)
+                        raise
+                    LLM_LATENCY.labels(
+                        call_type=call_type, outcome="success" if text else "empty"
+                    ).observe(time.perf_counter() - started)
+                    call_span.set_attribute("llm.response_chars", len(text or ""))
+                LLM_TOKENS.labels(call_type=call_type, direction="in").inc(prompt_tokens)
                 
                 # Extract text from response
-                if response.text:
-                    print(f"✓ Generation successful ({len(response.text)} chars)")
-                    return response.text
+                if text:
+                    LLM_TOKENS.labels(call_type=call_type, direction="out").inc(estimate_tokens(text))
+                    logger.debug("Generation successful (%d chars)", len(text), extra={"call_type": call_type})
+                    return text
                 else:
-                    print(f"⚠️ Empty response on attempt {attempt + 1}")
+                    logger.warning("Empty response on attempt %d", attempt + 1, extra={"call_type": call_type})
                     if attempt < retry_count - 1:
+                        LLM_RETRIES.labels(call_type=call_type, reason="empty").inc()
                         wait_time = backoff_factor ** attempt + random.uniform(0, 1)
-                        print(f"⏳ Waiting {wait_time:.2f}s before retry...")
+                        logger.debug("Waiting %.2fs before retry", wait_time)
                         time.sleep(wait_time)
                         continue
                     else:
-                        raise Exception("Gemini returned empty response after all retries")
+                        raise Exception("LLM returned empty response after all retries")
                         
             except Exception as e:
                 error_msg = str(e)
-                print(f"❌ Attempt {attempt + 1} failed: {error_msg}")
+                logger.warning("Attempt %d/%d failed: %s", attempt + 1, retry_count, error_msg, extra={"call_type": call_type})
                 
                 # Check for specific errors
                 if "429" in error_msg or "quota" in error_msg.lower():
-                    print("⚠️ Rate limit hit, using longer backoff...")
+                    logger.debug("Rate limit hit, using longer backoff")
+                    reason = "rate_limit"
                     wait_time = (backoff_factor ** (attempt + 2)) + random.uniform(0, 2)
                 elif "500" in error_msg or "503" in error_msg:
-                    print("⚠️ Server error, retrying with backoff...")
+                    logger.debug("Server error, retrying with backoff")
+                    reason = "server_error"
                     wait_time = backoff_factor ** attempt + random.uniform(0, 1)
                 else:
+                    reason = "other"
                     wait_time = backoff_factor ** attempt + random.uniform(0, 1)
                 
                 if attempt < retry_count - 1:
-                    print(f"⏳ Waiting {wait_time:.2f}s before retry...")
+                    LLM_RETRIES.labels(call_type=call_type, reason=reason).inc()
+                    logger.debug("Waiting %.2fs before retry", wait_time)
                     time.sleep(wait_time)
                 else:
-                    print(f"❌ All {retry_count} attempts failed")
+                    logger.error("All %d attempts failed", retry_count, extra={"call_type": call_type})
                     raise Exception(f"Failed after {retry_count} attempts: {error_msg}")
     
     def generate_quiz_questions(
@@ -84,27 +201,16 @@ class LLMService:
     ) -> List[Dict]:
         """Generate quiz questions from donor email content"""
         
-        print(f"\n{'='*60}")
-        print(f"📧 Generating {num_questions} quiz questions from email")
-        print(f"{'='*60}\n")
+        logger.info("Generating %d quiz questions from email", num_questions)
         
-        # Truncate email if too long
-        original_length = len(email_content)
-        if len(email_content) > 3000:
-            email_content = email_content[:3000] + "..."
-            print(f"📝 Email truncated from {original_length} to 3000 chars")
+        # Trim email to the token budget at a sentence boundary
+        with span("llm.prompt_build"):
+            original_tokens = estimate_tokens(email_content)
+            email_content = truncate_to_token_budget(email_content, settings.LLM_EMAIL_TOKEN_BUDGET)
+        if estimate_tokens(email_content) < original_tokens:
+            logger.debug("Email trimmed from ~%d to ~%d tokens", original_tokens, estimate_tokens(email_content))
         
-        system_prompt = """You are an expert educational assessment designer specializing in non-profit management, donor relations, and fundraising.
-
-Your task is to create challenging, thought-provoking multiple-choice questions that test deep understanding, not just recall.
-
-CRITICAL RULES:
-1. Return ONLY valid JSON - no markdown, no code blocks, no explanations
-2. Questions must be clear, specific, and challenging
-3. Explanations must be detailed and educational
-4. Focus on non-profit best practices and ethics
-5. Use simple, direct language
-6. Ensure all strings are properly closed"""
+        system_prompt = QUIZ_SYSTEM_PROMPT
         
         prompt = f"""Based on this donor email, generate EXACTLY {num_questions} multiple-choice questions about non-profit management, donor relations, fundraising practices, and ethical considerations in valid JSON format.
 
@@ -143,6 +249,9 @@ REQUIREMENTS:
 - Focus on practical non-profit management concepts
 - Return ONLY the JSON object, nothing else"""
         
+        structured = settings.LLM_STRUCTURED_OUTPUT
+        mode = "structured" if structured else "freetext"
+        
         try:
             # Generate with retry logic
             response = self.generate_completion(
@@ -151,60 +260,29 @@ REQUIREMENTS:
                 temperature=0.7,
                 max_tokens=5000,
                 retry_count=5,
-                backoff_factor=2.0
+                backoff_factor=2.0,
+                response_schema=QuestionSet if structured else None,
+                call_type="generate"
             )
             
-            # Clean the response
-            response = response.strip()
-            print(f"📄 Raw response length: {len(response)} chars")
-            
-            # Remove markdown code blocks if present
-            if "```json" in response:
-                print("🔧 Removing ```json markdown...")
-                response = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                print("🔧 Removing ``` markdown...")
-                response = response.split("```")[1].split("```")[0].strip()
-            
-            # Additional cleaning
-            response = response.replace('\n', ' ').replace('\r', '')
-            
-            # Try to fix common JSON issues
-            # Add closing brace if missing
-            open_braces = response.count('{')
-            close_braces = response.count('}')
-            if open_braces > close_braces:
-                response += '}' * (open_braces - close_braces)
-            
-            # Parse JSON
-            print("🔍 Parsing JSON response...")
-            try:
-                data = json.loads(response)
-            except json.JSONDecodeError as e:
-                # If parsing fails, try to extract just the questions array
-                print(f"⚠️ Initial parse failed, trying to extract questions array...")
-                match = re.search(r'"questions"\s*:\s*\[(.*)\]', response, re.DOTALL)
-                if match:
-                    questions_str = '[' + match.group(1) + ']'
-                    try:
-                        questions_list = json.loads(questions_str)
-                        data = {'questions': questions_list}
-                    except:
-                        # Final fallback - return default quiz
-                        print("⚠️ Failed to parse, using fallback quiz...")
-                        return self._get_fallback_quiz(num_questions)
+            logger.debug("Raw response length: %d chars", len(response))
+            with span("llm.parse", mode=mode) as parse_span:
+                if structured:
+                    questions = self._parse_structured_questions(response)
                 else:
-                    # Can't extract - use fallback
-                    print("⚠️ Could not extract questions, using fallback quiz...")
-                    return self._get_fallback_quiz(num_questions)
-
-            questions = data.get("questions", [])
+                    questions = self._parse_freetext_questions(response)
+                parse_span.set_attribute("llm.parse_ok", questions is not None)
+            
+            self._record_parse(mode, questions is not None)
+            if questions is None:
+                logger.warning("Failed to parse, using fallback quiz", extra={"mode": mode})
+                return self._serve_fallback_quiz(num_questions)
             
-            print(f"✓ Successfully generated {len(questions)} questions")
+            logger.debug("Parsed %d questions", len(questions))
             
             if len(questions) == 0:
-                print("⚠️ No questions in response, using fallback quiz...")
-                return self._get_fallback_quiz(num_questions)
+                logger.warning("No questions in response, using fallback quiz")
+                return self._serve_fallback_quiz(num_questions)
             
             # Validate each question has required fields
             required_fields = ['id', 'question_text', 'options', 'correct_answer', 'explanation', 'difficulty']
@@ -212,35 +290,103 @@ REQUIREMENTS:
             for i, q in enumerate(questions):
                 missing = [f for f in required_fields if f not in q]
                 if missing:
-                    print(f"⚠️ Question {i+1} missing fields: {', '.join(missing)}, skipping...")
+                    logger.warning("Question %d missing fields: %s, skipping", i + 1, ", ".join(missing))
                     continue
                 
                 # Validate options format
                 if len(q['options']) != 4:
-                    print(f"⚠️ Question {i+1} doesn't have 4 options, skipping...")
+                    logger.warning("Question %d doesn't have 4 options, skipping", i + 1)
                     continue
 
                 # Validate correct answer
                 if q['correct_answer'] not in ['A', 'B', 'C', 'D']:
-                    print(f"⚠️ Question {i+1} has invalid answer, fixing to 'A'...")
+                    logger.warning("Question %d has invalid answer, fixing to 'A'", i + 1)
                     q['correct_answer'] = 'A'
                 
                 valid_questions.append(q)            
             
             if len(valid_questions) == 0:
-                print("⚠️ No valid questions, using fallback quiz...")
-                return self._get_fallback_quiz(num_questions)
+                logger.warning("No valid questions, using fallback quiz")
+                return self._serve_fallback_quiz(num_questions)
             
-            print(f"\n{'='*60}")
-            print(f"✅ Quiz generation complete! {len(valid_questions)} valid questions")
-            print(f"{'='*60}\n")
+            logger.info("Quiz generation complete: %d valid questions", len(valid_questions))
             
             return valid_questions[:num_questions]
             
         except Exception as e:
-            print(f"❌ Error generating questions: {str(e)}")
-            print("⚠️ Using fallback quiz...")
-            return self._get_fallback_quiz(num_questions)
+            logger.error("Error generating questions, using fallback quiz: %s", e)
+            return self._serve_fallback_quiz(num_questions)
+    
+    @staticmethod
+    def _parse_structured_questions(response: str) -> Optional[List[Dict]]:
+        """Parse a response produced under the QuestionSet response schema"""
+        try:
+            return [q.model_dump() for q in QuestionSet.model_validate_json(response).questions]
+        except ValidationError as e:
+            logger.warning("Structured response failed validation: %d error(s)", e.error_count())
+            return None
+    
+    @staticmethod
+    def _parse_freetext_questions(response: str) -> Optional[List[Dict]]:
+        """Parse questions from a free-text response, repairing common JSON issues"""
+        # Clean the response
+        response = response.strip()
+        
+        # Remove markdown code blocks if present
+        if "```json" in response:
+            logger.debug("Removing ```json markdown")
+            response = response.split("```json")[1].split("```")[0].strip()
+        elif "```" in response:
+            logger.debug("Removing ``` markdown")
+            response = response.split("```")[1].split("```")[0].strip()
+        
+        # Additional cleaning
+        response = response.replace('\n', ' ').replace('\r', '')
+        
+        # Try to fix common JSON issues
+        # Add closing brace if missing
+        open_braces = response.count('{')
+        close_braces = response.count('}')
+        if open_braces > close_braces:
+            response += '}' * (open_braces - close_braces)
+        
+        # Parse JSON
+        logger.debug("Parsing JSON response")
+        try:
+            data = json.loads(response)
+        except json.JSONDecodeError:
+            # If parsing fails, try to extract just the questions array
+            logger.debug("Initial parse failed, trying to extract questions array")
+            match = re.search(r'"questions"\s*:\s*\[(.*)\]', response, re.DOTALL)
+            if not match:
+                logger.warning("Could not extract questions")
+                return None
+            try:
+                data = {'questions': json.loads('[' + match.group(1) + ']')}
+            except json.JSONDecodeError:
+                return None
+        
+        if not isinstance(data, dict):
+            return None
+        return data.get("questions", [])
+    
+    def _record_parse(self, mode: str, success: bool):
+        """Track parse outcomes per output mode"""
+        with self._stats_lock:
+            self.parse_stats[mode]["success" if success else "failure"] += 1
+            stats = self.parse_stats[mode]
+            total = stats["success"] + stats["failure"]
+        LLM_PARSES.labels(mode=mode, outcome="success" if success else "failure").inc()
+        logger.debug("%s parse success rate: %.1f%% (%d responses)", mode, 100 * stats["success"] / total, total)
+    
+    def is_fallback_quiz(self, questions: List[Dict]) -> bool:
+        """Whether questions are the canned fallback rather than generated ones"""
+        return questions == self._get_fallback_quiz(len(questions))
+    
+    def _serve_fallback_quiz(self, num_questions: int) -> List[Dict]:
+        """Fallback quiz returned in place of a failed generation"""
+        LLM_FALLBACKS.labels(call_type="generate").inc()
+        return self._get_fallback_quiz(num_questions)
     
     def _get_fallback_quiz(self, num_questions: int) -> List[Dict]:
         """Generate a fallback quiz when AI generation fails"""
@@ -347,10 +493,12 @@ Keep the tone professional, educational, and encouraging."""
                 temperature=0.7,
                 max_tokens=500,
                 retry_count=3,
-                backoff_factor=2.0
+                backoff_factor=2.0,
+                call_type="evaluate"
             )
         except Exception as e:
-            print(f"⚠️ Failed to generate detailed explanation, using fallback: {e}")
+            LLM_FALLBACKS.labels(call_type="evaluate").inc()
+            logger.warning("Failed to generate detailed explanation, using fallback: %s", e)
             return base_explanation if base_explanation else f"The correct answer is {correct_answer}."
     
     def generate_quiz_summary(
@@ -403,10 +551,12 @@ Keep the tone professional, supportive, and action-oriented. Focus on growth min
                 temperature=0.7,
                 max_tokens=1200,
                 retry_count=3,
-                backoff_factor=2.0
+                backoff_factor=2.0,
+                call_type="summary"
             )
         except Exception as e:
-            print(f"⚠️ Failed to generate detailed summary, using fallback: {e}")
+            LLM_FALLBACKS.labels(call_type="summary").inc()
+            logger.warning("Failed to generate detailed summary, using fallback: %s", e)
             performance = "Excellent work!" if score >= 80 else "Good effort!" if score >= 60 else "Keep practicing!"
             return f"""QUIZ SUMMARY
 
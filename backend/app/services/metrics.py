@@ -0,0 +1,125 @@
+from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from contextlib import contextmanager
+import json
+import time
+
+# Buckets span sub-millisecond storage calls up to multi-second LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# ============================================
+# LLM
+# ============================================
+
+LLM_LATENCY = Histogram(
+    "quizbot_llm_request_seconds",
+    "LLM provider call latency (one attempt)",
+    ["call_type", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_RETRIES = Counter(
+    "quizbot_llm_retries_total",
+    "LLM attempts that were retried",
+    ["call_type", "reason"]
+)
+LLM_FALLBACKS = Counter(
+    "quizbot_llm_fallbacks_total",
+    "Canned responses served because the LLM failed",
+    ["call_type"]
+)
+LLM_TOKENS = Counter(
+    "quizbot_llm_tokens_total",
+    "Estimated tokens sent to and received from the LLM",
+    ["call_type", "direction"]
+)
+LLM_PARSES = Counter(
+    "quizbot_llm_question_parses_total",
+    "Quiz question parse outcomes by output mode",
+    ["mode", "outcome"]
+)
+
+NEAR_DUPLICATE_LOOKUPS = Counter(
+    "quizbot_near_duplicate_lookups_total",
+    "Quiz generations checked against the near-duplicate index",
+    ["outcome"]
+)
+
+# ============================================
+# EMBEDDINGS / VECTOR STORE
+# ============================================
+
+EMBEDDING_LATENCY = Histogram(
+    "quizbot_embedding_seconds",
+    "Sentence-transformer encode latency",
+    ["operation"],
+    buckets=LATENCY_BUCKETS
+)
+VECTOR_LATENCY = Histogram(
+    "quizbot_vector_store_seconds",
+    "Vector store insert/search latency, excluding embedding",
+    ["backend", "operation"],
+    buckets=LATENCY_BUCKETS
+)
+
+VECTOR_DOCUMENTS = Gauge(
+    "quizbot_vector_store_documents",
+    "Emails in the vector store, as of the last compaction or stats call"
+)
+VECTOR_DISK_BYTES = Gauge(
+    "quizbot_vector_store_disk_bytes",
+    "Size of VECTOR_DB_PATH on disk, as of the last compaction or stats call"
+)
+VECTOR_COMPACTION_REMOVED = Counter(
+    "quizbot_vector_compaction_removed_total",
+    "Emails removed from the vector store by compaction",
+    ["reason"]
+)
+
+# ============================================
+# STORAGE
+# ============================================
+
+STORAGE_LATENCY = Histogram(
+    "quizbot_storage_seconds",
+    "Storage backend call latency",
+    ["backend", "operation"],
+    buckets=LATENCY_BUCKETS
+)
+STORAGE_BYTES = Counter(
+    "quizbot_storage_bytes_total",
+    "Approximate JSON bytes read from / written to the storage backend",
+    ["backend", "direction"]
+)
+
+# ============================================
+# HTTP
+# ============================================
+
+HTTP_LATENCY = Histogram(
+    "quizbot_http_request_seconds",
+    "HTTP request latency by route template (time to response headers)",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_IN_PROGRESS = Gauge(
+    "quizbot_http_requests_in_progress",
+    "HTTP requests currently being handled"
+)
+
+@contextmanager
+def observe(histogram: Histogram, **labels):
+    """Time the block into histogram.labels(**labels)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+def payload_size(value) -> int:
+    """Approximate wire size of a JSON-serializable value"""
+    if value is None:
+        return 0
+    return len(json.dumps(value, default=str))
+
+def render_metrics() -> tuple:
+    """(body, content_type) for the /metrics endpoint"""
+    return generate_latest(), CONTENT_TYPE_LATEST
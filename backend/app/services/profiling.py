@@ -0,0 +1,69 @@
+from fastapi import Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
+from app.config import settings
+import asyncio
+import logging
+import secrets
+
+logger = logging.getLogger(__name__)
+
+def is_admin_request(request: Request) -> bool:
+    """Whether the request carries the configured ADMIN_TOKEN in X-Admin-Token"""
+    token = request.headers.get("X-Admin-Token")
+    if not settings.ADMIN_TOKEN or not token:
+        return False
+    return secrets.compare_digest(token, settings.ADMIN_TOKEN)
+
+class ProfilingService:
+    """On-demand pyinstrument sampling of this worker's event loop
+
+    Only one profiler can sample the loop thread at a time, so sessions are
+    serialized; callers get None back when one is already running.
+    """
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+
+    @staticmethod
+    def _render(profiler, output: str) -> Response:
+        if output == "text":
+            return PlainTextResponse(profiler.output_text(unicode=True, show_all=False))
+        return HTMLResponse(profiler.output_html())
+
+    async def profile_request(self, request: Request, call_next, output: str = "html") -> Response:
+        """Run the request under the profiler and return the report instead of its response"""
+        from pyinstrument import Profiler
+
+        if self.lock.locked():
+            return PlainTextResponse("A profiling session is already running", status_code=409)
+        async with self.lock:
+            profiler = Profiler(async_mode="enabled")
+            profiler.start()
+            try:
+                response = await call_next(request)
+            finally:
+                profiler.stop()
+        logger.info("Profiled request", extra={"path": request.url.path, "status": response.status_code})
+        return self._render(profiler, output)
+
+    async def profile_for(self, seconds: float, output: str = "html") -> Response:
+        """Sample everything the event loop runs for `seconds`
+
+        Work already handed to the threadpool (LLM calls, embeddings) shows up
+        as time awaiting it, not as its own frames.
+        """
+        from pyinstrument import Profiler
+
+        if self.lock.locked():
+            return PlainTextResponse("A profiling session is already running", status_code=409)
+        async with self.lock:
+            profiler = Profiler(async_mode="disabled")
+            profiler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.stop()
+        logger.info("Profiled event loop for %.1fs", seconds)
+        return self._render(profiler, output)
+
+profiling_service = ProfilingService()
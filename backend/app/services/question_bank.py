@@ -0,0 +1,229 @@
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import sqlite, postgresql
+from sqlalchemy.exc import IntegrityError
+from app.config import settings
+from app.services.llm_service import llm_service
+from app.models.database import SessionLocal, QuestionBankSource, BankQuestion, init_db
+from app.models.schemas import Question
+from app.utils.email_parser import EmailParser
+from app.utils.helpers import hash_text, extract_topics_from_text
+from typing import List, Dict, Optional
+from datetime import datetime
+import asyncio
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+def _insert_ignoring_duplicates(db, model, rows: List[Dict], index_elements: List[str]) -> int:
+    """INSERT ... ON CONFLICT DO NOTHING and commit; returns the number of rows inserted"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        insert_fn = postgresql.insert
+    elif dialect == "sqlite":
+        insert_fn = sqlite.insert
+    else:
+        # No ON CONFLICT: insert row by row, each in a savepoint
+        added = 0
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(model).values(row))
+                added += 1
+            except IntegrityError:
+                pass
+        db.commit()
+        return added
+    
+    stmt = insert_fn(model).values(rows).on_conflict_do_nothing(index_elements=index_elements)
+    result = db.execute(stmt)
+    db.commit()
+    return result.rowcount
+
+class QuestionBank:
+    """Pre-generated, validated questions per source email
+
+    Quizzes for a known email are assembled by sampling the bank with
+    difficulty balancing; a background task tops banks up to
+    QUESTION_BANK_TARGET_SIZE during off-peak hours.
+    """
+
+    def __init__(self):
+        self.llm = llm_service
+        self.session_factory = SessionLocal
+        self.refill_task: Optional[asyncio.Task] = None
+        init_db()
+
+    @staticmethod
+    def source_hash(email_content: str) -> str:
+        """Hash of the whitespace/case-normalized email"""
+        return hash_text(" ".join(email_content.split()).lower())
+
+    def register_source(self, email_content: str) -> str:
+        """Store and tag a source email; returns its hash. Re-registering is a no-op"""
+        source_hash = self.source_hash(email_content)
+        db = self.session_factory()
+        try:
+            _insert_ignoring_duplicates(db, QuestionBankSource, [{
+                'source_hash': source_hash,
+                'content': email_content,
+                'category': EmailParser.categorize_email(email_content),
+                'topics': extract_topics_from_text(email_content)
+            }], ['source_hash'])
+            return source_hash
+        finally:
+            db.close()
+    
+    def source_contents(self, limit: int) -> List[str]:
+        """Contents of the most recently registered sources, oldest first"""
+        db = self.session_factory()
+        try:
+            rows = db.query(QuestionBankSource.content).order_by(
+                QuestionBankSource.id.desc()
+            ).limit(limit).all()
+            return [content for (content,) in reversed(rows)]
+        finally:
+            db.close()
+
+    def deposit(self, source_hash: str, questions: List[Dict]) -> int:
+        """Validate and store questions, skipping duplicates; returns number added
+
+        Duplicates include rows a concurrent deposit (refill loop vs.
+        on-demand generation) commits first.
+        """
+        rows = {}
+        for q in questions:
+            try:
+                question = Question(**q)
+            except Exception:
+                continue
+            text_hash = hash_text(question.question_text.strip().lower())
+            rows.setdefault(text_hash, {
+                'source_hash': source_hash,
+                'text_hash': text_hash,
+                'difficulty': question.difficulty.lower() if question.difficulty.lower() in DIFFICULTIES else "medium",
+                'question_json': question.model_dump()
+            })
+        if not rows:
+            return 0
+        
+        db = self.session_factory()
+        try:
+            return _insert_ignoring_duplicates(
+                db, BankQuestion, list(rows.values()), ['source_hash', 'text_hash']
+            )
+        finally:
+            db.close()
+    
+    def sample(self, source_hash: str, num_questions: int) -> Optional[List[Dict]]:
+        """Assemble a difficulty-balanced question set, or None if the bank is too small
+
+        Difficulties are drawn round-robin; within each, least-served
+        questions are preferred so repeat quizzes rotate through the bank.
+        """
+        db = self.session_factory()
+        try:
+            rows = db.query(BankQuestion).filter(
+                BankQuestion.source_hash == source_hash
+            ).all()
+            if len(rows) < num_questions:
+                return None
+
+            buckets = {d: [] for d in DIFFICULTIES}
+            for row in rows:
+                buckets[row.difficulty].append(row)
+            for bucket in buckets.values():
+                random.shuffle(bucket)
+                bucket.sort(key=lambda r: r.times_served)
+
+            picked = []
+            order = DIFFICULTIES[:]
+            random.shuffle(order)
+            while len(picked) < num_questions:
+                for difficulty in order:
+                    if buckets[difficulty] and len(picked) < num_questions:
+                        picked.append(buckets[difficulty].pop(0))
+
+            questions = []
+            for i, row in enumerate(picked):
+                row.times_served += 1
+                # Ids are per quiz so answers map back to this question set
+                questions.append({**row.question_json, 'id': f"q{i + 1}"})
+            db.commit()
+            return questions
+        finally:
+            db.close()
+
+    def _sources_below_target(self) -> List[QuestionBankSource]:
+        db = self.session_factory()
+        try:
+            counts = db.query(
+                BankQuestion.source_hash, func.count(BankQuestion.id)
+            ).group_by(BankQuestion.source_hash).all()
+            count_map = dict(counts)
+            return [
+                source for source in db.query(QuestionBankSource).all()
+                if count_map.get(source.source_hash, 0) < settings.QUESTION_BANK_TARGET_SIZE
+            ]
+        finally:
+            db.close()
+
+    def _mark_refilled(self, source_hash: str):
+        db = self.session_factory()
+        try:
+            db.query(QuestionBankSource).filter(
+                QuestionBankSource.source_hash == source_hash
+            ).update({'last_refilled_at': datetime.utcnow()})
+            db.commit()
+        finally:
+            db.close()
+
+    def refill_source(self, source: QuestionBankSource) -> int:
+        """Generate one batch of questions for a source"""
+        questions = self.llm.generate_quiz_questions(
+            email_content=source.content,
+            num_questions=10
+        )
+        if self.llm.is_fallback_quiz(questions):
+            return 0
+        added = self.deposit(source.source_hash, questions)
+        self._mark_refilled(source.source_hash)
+        logger.info("Question bank %s: +%d questions", source.source_hash[:12], added)
+        return added
+
+    @staticmethod
+    def is_off_peak(hour: Optional[int] = None) -> bool:
+        """Whether hour (default: now) falls in QUESTION_BANK_OFFPEAK_HOURS, e.g. "1-6" or "22-5" """
+        hour = datetime.now().hour if hour is None else hour
+        start, end = (int(h) for h in settings.QUESTION_BANK_OFFPEAK_HOURS.split("-"))
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    async def _refill_loop(self):
+        while True:
+            if self.is_off_peak():
+                try:
+                    for source in await run_in_threadpool(self._sources_below_target):
+                        if not self.is_off_peak():
+                            break
+                        await run_in_threadpool(self.refill_source, source)
+                except Exception as e:
+                    logger.exception("Question bank refill failed: %s", e)
+            await asyncio.sleep(settings.QUESTION_BANK_REFILL_INTERVAL)
+
+    async def start(self):
+        """Start background replenishment"""
+        self.refill_task = asyncio.create_task(self._refill_loop())
+        logger.info("Question bank replenishment started")
+
+    async def stop(self):
+        if self.refill_task:
+            self.refill_task.cancel()
+            await asyncio.gather(self.refill_task, return_exceptions=True)
+            self.refill_task = None
+
+question_bank = QuestionBank() if settings.QUESTION_BANK_ENABLED else None
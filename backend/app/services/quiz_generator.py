@@ -1,14 +1,70 @@
 from app.services.llm_service import llm_service
 from app.services.vector_db import vector_db
+from app.services.question_bank import question_bank
 from app.models.schemas import Quiz, Question, QuizResult, QuestionResult
-from typing import List, Dict
+from app.utils.helpers import hash_text, truncate_to_token_budget
+from app.utils.near_duplicate import NearDuplicateIndex, email_tokens, minhash
+from app.config import settings
+from app.services.tracing import span
+from app.services.metrics import NEAR_DUPLICATE_LOOKUPS
+from starlette.concurrency import run_in_threadpool
+from typing import List, Dict, AsyncIterator, Optional
+import asyncio
+import logging
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
 
 class QuizGenerator:
     def __init__(self):
         self.llm = llm_service
         self.vector_db = vector_db
+        self.question_bank = question_bank
+        # In-flight question generations keyed by email hash + question count
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Source key of the representative email for each cluster of near-identical
+        # emails; only keys are indexed, never another user's email text
+        self.near_duplicates = NearDuplicateIndex(
+            settings.NEAR_DUPLICATE_THRESHOLD, settings.NEAR_DUPLICATE_MAX_ENTRIES
+        ) if settings.NEAR_DUPLICATE_ENABLED else None
+        if self.near_duplicates is not None and self.question_bank is not None:
+            # Emails with a bank stay representatives across restarts
+            for content in self.question_bank.source_contents(settings.NEAR_DUPLICATE_MAX_ENTRIES):
+                tokens = email_tokens(content)
+                if len(tokens) >= settings.NEAR_DUPLICATE_MIN_WORDS:
+                    self.near_duplicates.add(minhash(tokens), self._source_key(content))
+    
+    @staticmethod
+    def _source_key(email_content: str) -> str:
+        """Hash of the whitespace/case-normalized email (the question bank's source hash)"""
+        return hash_text(" ".join(email_content.split()).lower())
+    
+    @staticmethod
+    def _generation_key(email_content: str, num_questions: int) -> str:
+        """Key identical generations regardless of whitespace and case"""
+        return f"{QuizGenerator._source_key(email_content)}:{num_questions}"
+    
+    def _representative_key(self, email_content: str, source_key: str) -> str:
+        """Source key of the indexed near-duplicate of email_content, or source_key itself
+        
+        Unmatched emails become the representative for later near-duplicates.
+        Runs on the event loop (a few hundred microseconds), which also keeps
+        index updates single-threaded.
+        """
+        tokens = email_tokens(email_content)
+        if len(tokens) < settings.NEAR_DUPLICATE_MIN_WORDS:
+            NEAR_DUPLICATE_LOOKUPS.labels(outcome="too_short").inc()
+            return source_key
+        
+        signature = minhash(tokens)
+        representative = self.near_duplicates.find(signature)
+        if representative is None:
+            self.near_duplicates.add(signature, source_key)
+            NEAR_DUPLICATE_LOOKUPS.labels(outcome="miss").inc()
+            return source_key
+        NEAR_DUPLICATE_LOOKUPS.labels(outcome="hit").inc()
+        return representative
     
     async def generate_quiz(
         self,
@@ -16,40 +72,175 @@ class QuizGenerator:
         email_content: str,
         num_questions: int = 5
     ) -> Quiz:
-        """Generate a quiz from donor email content"""
+        """Generate a quiz from donor email content
         
-        # Store email in vector DB for future reference
-        email_id = str(uuid.uuid4())
-        self.vector_db.add_email(
-            email_id=email_id,
-            content=email_content,
-            metadata={
-                "user_id": user_id,
-                "created_at": datetime.now().isoformat()
-            }
-        )
+        Concurrent requests for the same email and question count share one
+        embedding + LLM round-trip; each caller still gets its own quiz id.
+        When the question bank is enabled and already holds enough questions
+        for this email, the quiz is sampled from it without calling the LLM.
         
-        # Generate questions using LLM
-        questions_data = self.llm.generate_quiz_questions(
-            email_content=email_content,
-            num_questions=num_questions
-        )
+        With near-duplicate detection enabled, an email that differs from an
+        earlier one only in dates, amounts, phone numbers or email addresses
+        shares that email's in-flight generation and question bank. Only the
+        match's key is used: the quiz's email_context and the vector store
+        entry are always the caller's own email.
+        """
+        with span("quiz.generate", num_questions=num_questions) as current:
+            source_key = self._source_key(email_content)
+            if self.near_duplicates is not None:
+                matched_key = self._representative_key(email_content, source_key)
+                current.set_attribute("quiz.near_duplicate", matched_key != source_key)
+                source_key = matched_key
+            
+            questions_data = None
+            if self.question_bank is not None:
+                with span("question_bank.sample"):
+                    questions_data = await run_in_threadpool(
+                        self.question_bank.sample,
+                        source_key,
+                        num_questions
+                    )
+            current.set_attribute("quiz.from_bank", questions_data is not None)
+            
+            if questions_data is None:
+                questions_data = await self._generate_questions_once(
+                    user_id, email_content, num_questions, source_key
+                )
+            
+            # Convert to Question objects
+            questions = [
+                Question(**q) for q in questions_data
+            ]
+            
+            # Create quiz object
+            quiz = Quiz(
+                quiz_id=str(uuid.uuid4()),
+                user_id=user_id,
+                email_context=email_content,
+                questions=questions,
+                created_at=datetime.now(timezone.utc)
+            )
+            current.set_attribute("quiz.id", quiz.quiz_id)
+            
+            return quiz
+    
+    async def generate_batch(
+        self,
+        user_id: str,
+        emails: List[str],
+        num_questions: int = 5
+    ) -> AsyncIterator[Dict]:
+        """Generate one quiz per distinct email, yielding progress events as they finish
+        
+        Duplicate emails (after normalization) are generated once and reported
+        with all their input indices. At most BATCH_MAX_CONCURRENCY generations
+        run at a time; LLMService paces the actual calls to the quota.
+        """
+        unique: Dict[str, List[int]] = {}
+        for index, email in enumerate(emails):
+            unique.setdefault(self._generation_key(email, num_questions), []).append(index)
+        
+        semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENCY)
+        
+        async def run(indices: List[int]) -> Dict:
+            async with semaphore:
+                try:
+                    quiz = await self.generate_quiz(user_id, emails[indices[0]], num_questions)
+                    return {"event": "quiz", "email_indices": indices, "quiz": quiz}
+                except Exception as e:
+                    return {"event": "error", "email_indices": indices, "error": str(e)}
+        
+        tasks = [asyncio.create_task(run(indices)) for indices in unique.values()]
+        try:
+            for completed, next_done in enumerate(asyncio.as_completed(tasks), start=1):
+                event = await next_done
+                event.update(completed=completed, total=len(tasks))
+                yield event
+        finally:
+            for task in tasks:
+                task.cancel()
+    
+    async def _generate_questions_once(
+        self,
+        user_id: str,
+        email_content: str,
+        num_questions: int,
+        source_key: Optional[str] = None
+    ) -> List[Dict]:
+        """Store the caller's email and run _generate_questions, sharing one task
+        between concurrent calls for the same source key and question count
+        """
+        source_key = source_key or self._source_key(email_content)
+        key = f"{source_key}:{num_questions}"
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                self._generate_questions(email_content, num_questions, source_key)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.debug("Joining in-flight generation %s", key[:12])
         
-        # Convert to Question objects
-        questions = [
-            Question(**q) for q in questions_data
-        ]
+        # Every caller's own email is stored under its own user_id, including joiners
+        await self._store_email(user_id, email_content)
+        # Shield so one caller disconnecting doesn't cancel the shared work
+        return await asyncio.shield(task)
+    
+    async def _store_email(self, user_id: str, email_content: str):
+        """Store the email in the vector DB; one entry per user and distinct
+        email, refreshed (not duplicated) when it comes back
+        """
+        email_id = hash_text(f"{user_id}\0{' '.join(email_content.split()).lower()}")
+        with span("vector.add_email"):
+            await run_in_threadpool(
+                self.vector_db.add_email,
+                email_id=email_id,
+                content=email_content,
+                metadata={
+                    "user_id": user_id,
+                    "created_at": datetime.now().isoformat()
+                }
+            )
+    
+    async def _generate_questions(
+        self,
+        email_content: str,
+        num_questions: int,
+        source_key: str
+    ) -> List[Dict]:
+        """Generate questions and seed the bank under source_key; blocking calls run in the threadpool"""
         
-        # Create quiz object
-        quiz = Quiz(
-            quiz_id=str(uuid.uuid4()),
-            user_id=user_id,
-            email_context=email_content,
-            questions=questions,
-            created_at=datetime.now()
-        )
+        # Compress long emails to their most representative sentences
+        with span("context.compress"):
+            prompt_email = await run_in_threadpool(
+                self.vector_db.extract_key_sentences,
+                email_content,
+                settings.LLM_EMAIL_TOKEN_BUDGET
+            )
         
-        return quiz
+        # Generate questions using LLM
+        with span("llm.generate_questions"):
+            questions_data = await run_in_threadpool(
+                self.llm.generate_quiz_questions,
+                email_content=prompt_email,
+                num_questions=num_questions
+            )
+        
+        # Seed the question bank so later quizzes for this email (or its
+        # near-duplicates, which share the representative's key) skip the LLM
+        # (best-effort: a failure here must not cost the caller their quiz)
+        if self.question_bank is not None:
+            with span("question_bank.deposit"):
+                try:
+                    if source_key == self._source_key(email_content):
+                        await run_in_threadpool(self.question_bank.register_source, email_content)
+                    if not self.llm.is_fallback_quiz(questions_data):
+                        await run_in_threadpool(self.question_bank.deposit, source_key, questions_data)
+                except Exception as e:
+                    logger.warning("Question bank deposit failed for %s: %s", source_key[:12], e)
+        
+        return questions_data
     
     async def evaluate_quiz(
         self,
@@ -58,60 +249,67 @@ class QuizGenerator:
     ) -> QuizResult:
         """Evaluate user's quiz submission"""
         
-        results = []
-        correct_count = 0
-        
-        # Create answer lookup
-        answer_map = {ans['question_id']: ans['selected_answer'] for ans in user_answers}
-        
-        for question in quiz.questions:
-            user_answer = answer_map.get(question.id, "")
-            is_correct = user_answer.strip().upper() == question.correct_answer.strip().upper()
+        with span("quiz.evaluate", num_questions=len(quiz.questions)):
+            results = []
+            correct_count = 0
             
-            if is_correct:
-                correct_count += 1
+            # Create answer lookup
+            context = truncate_to_token_budget(quiz.email_context, settings.LLM_CONTEXT_TOKEN_BUDGET)
+            answer_map = {ans['question_id']: ans['selected_answer'] for ans in user_answers}
             
-            # Generate detailed explanation
-            detailed_explanation = self.llm.evaluate_answer(
-                question=question.question_text,
-                correct_answer=question.correct_answer,
-                user_answer=user_answer,
-                base_explanation=question.explanation,
-                context=quiz.email_context[:500]
-            )
+            for question in quiz.questions:
+                user_answer = answer_map.get(question.id, "")
+                is_correct = user_answer.strip().upper() == question.correct_answer.strip().upper()
+                
+                if is_correct:
+                    correct_count += 1
+                
+                # Generate detailed explanation
+                # LLM calls block on the concurrency limit and rate pacing, so keep them off the event loop
+                with span("llm.evaluate_answer", question_id=question.id):
+                    detailed_explanation = await run_in_threadpool(
+                        self.llm.evaluate_answer,
+                        question=question.question_text,
+                        correct_answer=question.correct_answer,
+                        user_answer=user_answer,
+                        base_explanation=question.explanation,
+                        context=context
+                    )
+                
+                results.append(
+                    QuestionResult(
+                        question_id=question.id,
+                        question_text=question.question_text,
+                        selected_answer=user_answer,
+                        correct_answer=question.correct_answer,
+                        is_correct=is_correct,
+                        explanation=detailed_explanation
+                    )
+                )
             
-            results.append(
-                QuestionResult(
-                    question_id=question.id,
-                    question_text=question.question_text,
-                    selected_answer=user_answer,
-                    correct_answer=question.correct_answer,
-                    is_correct=is_correct,
-                    explanation=detailed_explanation
+            # Calculate score
+            total_questions = len(quiz.questions)
+            score = (correct_count / total_questions) * 100
+            
+            # Generate summary
+            with span("llm.summary"):
+                summary = await run_in_threadpool(
+                    self.llm.generate_quiz_summary,
+                    score=score,
+                    total=total_questions,
+                    results=[r.dict() for r in results],
+                    email_context=quiz.email_context
                 )
+            
+            return QuizResult(
+                quiz_id=quiz.quiz_id,
+                user_id=quiz.user_id,
+                score=score,
+                total_questions=total_questions,
+                correct_answers=correct_count,
+                results=results,
+                summary=summary,
+                completed_at=datetime.now()
             )
-        
-        # Calculate score
-        total_questions = len(quiz.questions)
-        score = (correct_count / total_questions) * 100
-        
-        # Generate summary
-        summary = self.llm.generate_quiz_summary(
-            score=score,
-            total=total_questions,
-            results=[r.dict() for r in results],
-            email_context=quiz.email_context
-        )
-        
-        return QuizResult(
-            quiz_id=quiz.quiz_id,
-            user_id=quiz.user_id,
-            score=score,
-            total_questions=total_questions,
-            correct_answers=correct_count,
-            results=results,
-            summary=summary,
-            completed_at=datetime.now()
-        )
 
 quiz_generator = QuizGenerator()
\ No newline at end of file
@@ -0,0 +1,336 @@
+from abc import ABC, abstractmethod
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.utils.helpers import extract_topics_from_text, utc_timestamp
+from app.services.metrics import STORAGE_LATENCY, STORAGE_BYTES, payload_size
+from app.services.tracing import span
+from typing import Optional, Dict, List, Tuple
+from datetime import datetime, timedelta, timezone
+import asyncio
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+def quiz_expiry_cutoff(now: datetime) -> Optional[datetime]:
+    """Creation time before which unsubmitted quizzes are expired, or None if they never expire"""
+    if settings.QUIZ_EXPIRY_HOURS <= 0:
+        return None
+    return now - timedelta(hours=settings.QUIZ_EXPIRY_HOURS)
+
+class StorageBackend(ABC):
+    """Persistence interface for user profiles, quizzes and quiz results
+    
+    Methods are coroutines so blocking drivers can be kept off the event loop.
+    """
+
+    purge_task: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    async def get_user_profile(self, uid: str) -> Optional[Dict]:
+        """Get user profile"""
+
+    @abstractmethod
+    async def create_user_profile(self, uid: str, email: str, full_name: str) -> Dict:
+        """Create user profile"""
+
+    @abstractmethod
+    async def save_quiz(self, quiz: Dict):
+        """Persist a generated quiz"""
+
+    @abstractmethod
+    async def get_quiz(self, quiz_id: str) -> Optional[Dict]:
+        """Get a generated quiz that has not been submitted yet"""
+
+    @abstractmethod
+    async def claim_quiz(self, quiz_id: str, user_id: str) -> Optional[Dict]:
+        """Atomically take a user's unexpired, unsubmitted quiz for evaluation
+
+        Only one of several concurrent claims succeeds; the others get None.
+        """
+
+    @abstractmethod
+    async def release_quiz(self, quiz_id: str):
+        """Return a claimed quiz whose evaluation failed so it can be resubmitted"""
+
+    @abstractmethod
+    async def purge_expired_quizzes(self) -> int:
+        """Delete unsubmitted quizzes older than QUIZ_EXPIRY_HOURS; returns how many"""
+
+    @abstractmethod
+    async def save_quiz_result(self, user_id: str, quiz_result: Dict):
+        """Persist a quiz result and update user stats"""
+
+    @abstractmethod
+    async def get_user_history(self, user_id: str) -> List[Dict]:
+        """Get user's quiz history, newest first"""
+
+    @abstractmethod
+    async def get_user_analytics(self, user_id: str) -> Dict:
+        """Get user analytics and progress"""
+
+    async def _purge_loop(self):
+        while True:
+            await asyncio.sleep(settings.QUIZ_PURGE_INTERVAL)
+            try:
+                purged = await self.purge_expired_quizzes()
+                if purged:
+                    logger.info("Purged %d expired quizzes", purged)
+            except Exception as e:
+                logger.exception("Purging expired quizzes failed: %s", e)
+
+    async def start(self):
+        """Start purging expired quizzes if QUIZ_EXPIRY_HOURS is set"""
+        if settings.QUIZ_EXPIRY_HOURS > 0 and settings.QUIZ_PURGE_INTERVAL > 0:
+            self.purge_task = asyncio.create_task(self._purge_loop())
+
+    async def stop(self):
+        if self.purge_task:
+            self.purge_task.cancel()
+            await asyncio.gather(self.purge_task, return_exceptions=True)
+            self.purge_task = None
+
+
+class FirebaseStorage(StorageBackend):
+    """Firebase Realtime Database backend"""
+
+    def __init__(self):
+        from app.services.auth_service import auth_service
+        self.auth_service = auth_service
+
+    async def _call(self, operation: str, fn, *args, written=None):
+        """Run a blocking auth_service call in the threadpool, recording latency and bytes"""
+        started = time.perf_counter()
+        try:
+            with span(f"firebase.{operation}"):
+                result = await run_in_threadpool(fn, *args)
+        finally:
+            STORAGE_LATENCY.labels(backend="firebase", operation=operation).observe(time.perf_counter() - started)
+        if written is not None:
+            STORAGE_BYTES.labels(backend="firebase", direction="write").inc(payload_size(written))
+        if result is not None:
+            STORAGE_BYTES.labels(backend="firebase", direction="read").inc(payload_size(result))
+        return result
+
+    async def get_user_profile(self, uid: str) -> Optional[Dict]:
+        return await self._call("get_user_profile", self.auth_service.get_user_profile, uid)
+
+    async def create_user_profile(self, uid: str, email: str, full_name: str) -> Dict:
+        return await self._call(
+            "create_user_profile", self.auth_service.create_user_profile, uid, email, full_name,
+            written={'uid': uid, 'email': email, 'full_name': full_name}
+        )
+
+    async def save_quiz(self, quiz: Dict):
+        await self._call("save_quiz", self.auth_service.save_quiz, quiz, written=quiz)
+
+    @staticmethod
+    def _not_before() -> Optional[str]:
+        # Quiz created_at is stored as UTC ISO text (see utc_timestamp), which sorts chronologically
+        cutoff = quiz_expiry_cutoff(datetime.now(timezone.utc))
+        return utc_timestamp(cutoff) if cutoff else None
+
+    async def get_quiz(self, quiz_id: str) -> Optional[Dict]:
+        quiz = await self._call("get_quiz", self.auth_service.get_quiz, quiz_id)
+        not_before = self._not_before()
+        if quiz and not_before and str(quiz.get('created_at', '')) < not_before:
+            return None
+        return quiz
+
+    async def claim_quiz(self, quiz_id: str, user_id: str) -> Optional[Dict]:
+        return await self._call("claim_quiz", self.auth_service.claim_quiz, quiz_id, user_id, self._not_before())
+
+    async def release_quiz(self, quiz_id: str):
+        await self._call("release_quiz", self.auth_service.release_quiz, quiz_id)
+
+    async def purge_expired_quizzes(self) -> int:
+        not_before = self._not_before()
+        if not not_before:
+            return 0
+        return await self._call("purge_expired_quizzes", self.auth_service.purge_expired_quizzes, not_before)
+
+    async def save_quiz_result(self, user_id: str, quiz_result: Dict):
+        await self._call("save_quiz_result", self.auth_service.save_quiz_result, user_id, quiz_result, written=quiz_result)
+
+    async def get_user_history(self, user_id: str) -> List[Dict]:
+        return await self._call("get_user_history", self.auth_service.get_user_history, user_id)
+
+    async def get_user_analytics(self, user_id: str) -> Dict:
+        return await self._call("get_user_analytics", self.auth_service.get_user_analytics, user_id)
+
+
+class SQLStorage(StorageBackend):
+    """SQLAlchemy backend (SQLite/Postgres) built on DatabaseService
+    
+    Uses the async engine when DATABASE_ASYNC is enabled, otherwise runs the
+    sync session in the threadpool.
+    """
+
+    def __init__(self):
+        from app.models.database import SessionLocal, AsyncSessionLocal, DatabaseService, init_db
+        self.session_factory = SessionLocal
+        self.async_session_factory = AsyncSessionLocal
+        self.db_service = DatabaseService
+        init_db()
+
+    async def _run(self, fn, *args):
+        """Run fn(db, *args) in a session that is closed afterwards"""
+        if self.async_session_factory is not None:
+            async with self.async_session_factory() as db:
+                return await db.run_sync(fn, *args)
+        return await run_in_threadpool(self._run_sync, fn, *args)
+
+    def _run_sync(self, fn, *args):
+        db = self.session_factory()
+        try:
+            return fn(db, *args)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _user_to_dict(user) -> Dict:
+        return {
+            'uid': user.uid,
+            'email': user.email,
+            'full_name': user.full_name,
+            'created_at': user.created_at.isoformat() if user.created_at else None,
+            'total_quizzes': user.total_quizzes,
+            'total_score': user.total_score,
+            'average_score': user.average_score,
+            'last_quiz_date': user.last_quiz_date.isoformat() if user.last_quiz_date else None
+        }
+
+    @staticmethod
+    def _result_to_dict(result) -> Dict:
+        return {
+            'quiz_id': result.quiz_id,
+            'user_id': result.user_id,
+            'score': result.score,
+            'total_questions': result.total_questions,
+            'correct_answers': result.correct_answers,
+            'results': result.results_json,
+            'summary': result.summary,
+            'completed_at': result.completed_at.isoformat() if result.completed_at else ''
+        }
+
+    @staticmethod
+    def _topic_stats(quiz_result: Dict) -> Dict[str, Tuple[int, int]]:
+        """Tally (attempts, correct) per topic from the graded questions"""
+        topic_stats = {}
+        for r in quiz_result.get('results', []):
+            for topic in extract_topics_from_text(r.get('question_text', '')):
+                attempts, correct = topic_stats.get(topic, (0, 0))
+                topic_stats[topic] = (attempts + 1, correct + int(bool(r.get('is_correct'))))
+        return topic_stats
+
+    async def get_user_profile(self, uid: str) -> Optional[Dict]:
+        def query(db):
+            user = self.db_service.get_user_by_uid(db, uid)
+            return self._user_to_dict(user) if user else None
+        return await self._run(query)
+
+    async def create_user_profile(self, uid: str, email: str, full_name: str) -> Dict:
+        def create(db):
+            return self._user_to_dict(self.db_service.create_user(db, uid, email, full_name))
+        return await self._run(create)
+
+    async def save_quiz(self, quiz: Dict):
+        await self._run(self.db_service.save_quiz, {
+            'quiz_id': quiz['quiz_id'],
+            'user_id': quiz['user_id'],
+            'email_context': quiz['email_context'],
+            'questions_json': quiz['questions'],
+            'num_questions': len(quiz['questions'])
+        })
+
+    @staticmethod
+    def _quiz_to_dict(quiz) -> Dict:
+        return {
+            'quiz_id': quiz.quiz_id,
+            'user_id': quiz.user_id,
+            'email_context': quiz.email_context,
+            'questions': quiz.questions_json,
+            'created_at': quiz.created_at.isoformat() if quiz.created_at else None
+        }
+
+    @staticmethod
+    def _not_before() -> Optional[datetime]:
+        # Quiz rows default created_at to naive UTC (utcnow)
+        cutoff = quiz_expiry_cutoff(datetime.now(timezone.utc))
+        return cutoff.replace(tzinfo=None) if cutoff else None
+
+    async def get_quiz(self, quiz_id: str) -> Optional[Dict]:
+        not_before = self._not_before()
+
+        def query(db):
+            quiz = self.db_service.get_quiz(db, quiz_id)
+            if not quiz or quiz.is_completed:
+                return None
+            if not_before and quiz.created_at and quiz.created_at < not_before:
+                return None
+            return self._quiz_to_dict(quiz)
+        return await self._run(query)
+
+    async def claim_quiz(self, quiz_id: str, user_id: str) -> Optional[Dict]:
+        not_before = self._not_before()
+
+        def claim(db):
+            quiz = self.db_service.claim_quiz(db, quiz_id, user_id, not_before)
+            return self._quiz_to_dict(quiz) if quiz else None
+        return await self._run(claim)
+
+    async def release_quiz(self, quiz_id: str):
+        await self._run(self.db_service.release_quiz, quiz_id)
+
+    async def purge_expired_quizzes(self) -> int:
+        not_before = self._not_before()
+        if not_before is None:
+            return 0
+        return await self._run(self.db_service.purge_expired_quizzes, not_before)
+
+    async def save_quiz_result(self, user_id: str, quiz_result: Dict):
+        completed_at = quiz_result.get('completed_at')
+        if isinstance(completed_at, str):
+            completed_at = datetime.fromisoformat(completed_at)
+
+        result_data = {
+            'result_id': str(uuid.uuid4()),
+            'quiz_id': quiz_result['quiz_id'],
+            'user_id': user_id,
+            'score': quiz_result['score'],
+            'total_questions': quiz_result['total_questions'],
+            'correct_answers': quiz_result['correct_answers'],
+            'results_json': quiz_result.get('results', []),
+            'summary': quiz_result.get('summary'),
+            'completed_at': completed_at or datetime.utcnow()
+        }
+
+        await self._run(self.db_service.record_quiz_submission, result_data, self._topic_stats(quiz_result))
+
+    async def get_user_history(self, user_id: str) -> List[Dict]:
+        def query(db):
+            return [self._result_to_dict(r) for r in self.db_service.get_user_history(db, user_id)]
+        return await self._run(query)
+
+    async def get_user_analytics(self, user_id: str) -> Dict:
+        analytics = await self._run(self.db_service.get_user_analytics, user_id)
+        return analytics or {
+            'total_quizzes': 0,
+            'average_score': 0,
+            'total_questions_answered': 0,
+            'accuracy_rate': 0,
+            'improvement_trend': [],
+            'recent_quizzes': []
+        }
+
+
+def create_storage_backend(backend: str) -> StorageBackend:
+    """Create the storage backend selected by STORAGE_BACKEND"""
+    if backend == "firebase":
+        return FirebaseStorage()
+    elif backend == "sql":
+        return SQLStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+storage_service = create_storage_backend(settings.STORAGE_BACKEND)
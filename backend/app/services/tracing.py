@@ -0,0 +1,77 @@
+from app.config import settings
+from opentelemetry import trace
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from contextlib import contextmanager
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+class JsonLinesSpanExporter(SpanExporter):
+    """SpanExporter that appends finished spans to a local file, one JSON object per line
+
+    Each line is the SDK's ReadableSpan.to_json() (trace/span ids, parent,
+    timestamps, attributes), grouped by trace id when read back.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, spans):
+        lines = [finished.to_json(indent=None) for finished in spans]
+        with self.lock, open(self.path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+def _create_exporter(exporter: str):
+    if exporter == "file":
+        return JsonLinesSpanExporter(settings.TRACING_FILE_PATH)
+    elif exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    elif exporter == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown tracing exporter: {exporter}")
+
+def setup_tracing():
+    """Install an SDK tracer provider when TRACING_ENABLED; otherwise spans are no-ops"""
+    if not settings.TRACING_ENABLED:
+        return
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import TraceIdRatioBased, ParentBased
+
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.APP_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(settings.TRACING_SAMPLE_RATE))
+    )
+    provider.add_span_processor(BatchSpanProcessor(_create_exporter(settings.TRACING_EXPORTER)))
+    trace.set_tracer_provider(provider)
+    logger.info("Tracing enabled", extra={"exporter": settings.TRACING_EXPORTER})
+
+def shutdown_tracing():
+    """Flush pending spans"""
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+tracer = trace.get_tracer("quizbot")
+
+@contextmanager
+def span(name: str, **attributes):
+    """Start a child span of the current one; attributes with None values are dropped"""
+    with tracer.start_as_current_span(
+        name, attributes={k: v for k, v in attributes.items() if v is not None}
+    ) as current:
+        yield current
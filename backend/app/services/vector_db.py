@@ -1,57 +1,273 @@
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict
+from typing import List, Dict, Optional
 import faiss
+import logging
 import numpy as np
+import threading
 from app.config import settings
+from app.services.metrics import EMBEDDING_LATENCY, VECTOR_LATENCY, observe
+from app.services.tracing import span
+from app.utils.helpers import estimate_tokens, split_sentences, truncate_to_token_budget
+
+logger = logging.getLogger(__name__)
+
+COLLECTION_NAME = "donor_emails"
+# Holds the copy while a compaction rebuild is in progress
+REBUILD_COLLECTION_NAME = "donor_emails_rebuild"
+# Embeddings are unit length, so cosine distance ranks the same as inner product
+COLLECTION_METADATA = {"description": "Donor email embeddings", "hnsw:space": "cosine"}
+# VECTOR_FAISS_STORAGE values other than float32: 2 or 1 bytes per dimension
+FAISS_SCALAR_TYPES = {
+    "float16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit
+}
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
 
 class VectorDBService:
     def __init__(self):
         self.db_type = settings.VECTOR_DB_TYPE
         self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Serializes writes with rebuilds so no insert lands in a collection being replaced
+        self.write_lock = threading.RLock()
         
         if self.db_type == "chromadb":
             self.client = chromadb.PersistentClient(
                 path=settings.VECTOR_DB_PATH,
                 settings=ChromaSettings(anonymized_telemetry=False)
             )
-            self.collection = self.client.get_or_create_collection(
-                name="donor_emails",
-                metadata={"description": "Donor email embeddings"}
-            )
+            self._recover_rebuild()
+            # An existing collection keeps its distance function; only new ones get cosine
+            if COLLECTION_NAME in {collection.name for collection in self.client.list_collections()}:
+                self.collection = self.client.get_collection(COLLECTION_NAME)
+            else:
+                self.collection = self.client.create_collection(
+                    name=COLLECTION_NAME,
+                    metadata=COLLECTION_METADATA
+                )
+            if (self.collection.metadata or {}).get("hnsw:space") != "cosine":
+                logger.warning("Vector collection does not use cosine distance; run migrate_vectors.py to convert it")
         elif self.db_type == "faiss":
             self.dimension = 384  # all-MiniLM-L6-v2 dimension
-            self.index = faiss.IndexFlatL2(self.dimension)
+            self.index = self._new_faiss_index()
             self.metadata_store = {}
     
+    def _new_faiss_index(self):
+        """Inner-product index over unit vectors, stored at VECTOR_FAISS_STORAGE precision"""
+        storage = settings.VECTOR_FAISS_STORAGE
+        if storage == "float32":
+            return faiss.IndexFlatIP(self.dimension)
+        if storage not in FAISS_SCALAR_TYPES:
+            raise ValueError(f"VECTOR_FAISS_STORAGE must be float32, float16 or int8, not {storage!r}")
+        index = faiss.IndexScalarQuantizer(self.dimension, FAISS_SCALAR_TYPES[storage], faiss.METRIC_INNER_PRODUCT)
+        if not index.is_trained:
+            # Unit vector components lie in [-1, 1]; training on those bounds fixes
+            # the int8 range up front instead of fitting it to whichever batch comes first
+            index.train(np.stack([-np.ones(self.dimension), np.ones(self.dimension)]).astype(np.float32))
+        return index
+    
+    def _encode(self, texts):
+        """Unit-length float32 embeddings, so inner product is cosine similarity"""
+        return np.asarray(self.embedding_model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+    
     def add_email(self, email_id: str, content: str, metadata: Dict):
-        """Add email to vector database"""
-        embedding = self.embedding_model.encode(content)
+        """Add email to vector database, replacing any entry with the same id"""
+        with span("embedding"), observe(EMBEDDING_LATENCY, operation="add"):
+            embedding = self._encode(content)
+        
+        with span("vector.insert", backend=self.db_type), observe(VECTOR_LATENCY, backend=self.db_type, operation="add"), \
+                self.write_lock:
+            if self.db_type == "chromadb":
+                self.collection.upsert(
+                    ids=[email_id],
+                    embeddings=[embedding.tolist()],
+                    metadatas=[metadata],
+                    documents=[content]
+                )
+            elif self.db_type == "faiss":
+                if email_id in self.metadata_store:
+                    self.delete_emails([email_id])
+                self.index.add(embedding.reshape(1, -1))
+                self.metadata_store[email_id] = {
+                    "content": content,
+                    **metadata
+                }
+    
+    def add_emails(self, email_ids: List[str], contents: List[str], metadatas: List[Dict]):
+        """Add many emails with one batched encode and one insert
+        
+        Chroma upserts, so re-adding an id (e.g. when resuming an import)
+        replaces it; FAISS skips ids it already holds.
+        """
+        if self.db_type == "faiss":
+            keep = [i for i, email_id in enumerate(email_ids) if email_id not in self.metadata_store]
+            email_ids = [email_ids[i] for i in keep]
+            contents = [contents[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+        if not email_ids:
+            return
         
+        with span("embedding", batch_size=len(contents)), observe(EMBEDDING_LATENCY, operation="add_batch"):
+            embeddings = self._encode(contents)
+        
+        with span("vector.insert", backend=self.db_type, batch_size=len(contents)), \
+                observe(VECTOR_LATENCY, backend=self.db_type, operation="add_batch"), self.write_lock:
+            if self.db_type == "chromadb":
+                self.collection.upsert(
+                    ids=email_ids,
+                    embeddings=embeddings.tolist(),
+                    metadatas=metadatas,
+                    documents=contents
+                )
+            elif self.db_type == "faiss":
+                self.index.add(embeddings)
+                for email_id, content, metadata in zip(email_ids, contents, metadatas):
+                    self.metadata_store[email_id] = {
+                        "content": content,
+                        **metadata
+                    }
+    
+    def delete_emails(self, email_ids: List[str]) -> int:
+        """Remove emails by id; returns how many were stored
+        
+        FAISS flat indexes are positional, so the index is rebuilt from the
+        vectors that remain.
+        """
+        ids = set(email_ids)
+        if not ids:
+            return 0
+        with self.write_lock:
+            return self._delete(ids)
+    
+    def _delete(self, ids: set) -> int:
         if self.db_type == "chromadb":
-            self.collection.add(
-                ids=[email_id],
-                embeddings=[embedding.tolist()],
-                metadatas=[metadata],
-                documents=[content]
-            )
+            existing = self.collection.get(ids=list(ids), include=[])['ids']
+            if existing:
+                self.collection.delete(ids=existing)
+            return len(existing)
         elif self.db_type == "faiss":
-            self.index.add(np.array([embedding]))
-            self.metadata_store[email_id] = {
-                "content": content,
-                **metadata
-            }
+            keys = list(self.metadata_store)
+            keep = [i for i, key in enumerate(keys) if key not in ids]
+            removed = len(keys) - len(keep)
+            if removed:
+                vectors = self.index.reconstruct_n(0, self.index.ntotal)
+                self.index = self._new_faiss_index()
+                if keep:
+                    self.index.add(vectors[keep])
+                self.metadata_store = {keys[i]: self.metadata_store[keys[i]] for i in keep}
+            return removed
+    
+    def count(self) -> int:
+        """Number of stored emails"""
+        if self.db_type == "chromadb":
+            return self.collection.count()
+        return len(self.metadata_store)
+    
+    def list_entries(self, include_content: bool = False, page_size: int = 1000) -> List[Dict]:
+        """Every stored email's id and metadata (and content if asked), read in pages"""
+        if self.db_type == "faiss":
+            return [
+                {
+                    "id": email_id,
+                    "metadata": {k: v for k, v in stored.items() if k != "content"},
+                    **({"content": stored["content"]} if include_content else {})
+                }
+                for email_id, stored in self.metadata_store.items()
+            ]
+        
+        include = ["metadatas", "documents"] if include_content else ["metadatas"]
+        entries = []
+        offset = 0
+        while True:
+            page = self.collection.get(include=include, limit=page_size, offset=offset)
+            for i, email_id in enumerate(page['ids']):
+                entry = {"id": email_id, "metadata": page['metadatas'][i] or {}}
+                if include_content:
+                    entry["content"] = page['documents'][i]
+                entries.append(entry)
+            if len(page['ids']) < page_size:
+                return entries
+            offset += page_size
+    
+    def rebuild(self, page_size: int = 1000, reencode: bool = False) -> Optional[int]:
+        """Copy the Chroma collection into a fresh one, dropping HNSW tombstones
+        
+        Chroma marks deleted vectors rather than removing them, so after heavy
+        deletion the index and its files stay at their peak size. The copy
+        uses cosine distance and normalizes stored embeddings, so rebuilding
+        also converts collections created with L2; reencode=True embeds the
+        documents again instead (e.g. after changing the model). Writes wait
+        for the rebuild; returns the number of emails copied (None for FAISS,
+        whose deletes already rebuild).
+        """
+        if self.db_type != "chromadb":
+            return None
+        
+        with self.write_lock:
+            try:
+                self.client.delete_collection(REBUILD_COLLECTION_NAME)
+            except ValueError:
+                pass
+            fresh = self.client.create_collection(
+                name=REBUILD_COLLECTION_NAME,
+                metadata={**(self.collection.metadata or {}), **COLLECTION_METADATA}
+            )
+            copied = 0
+            while True:
+                page = self.collection.get(
+                    include=["embeddings", "metadatas", "documents"], limit=page_size, offset=copied
+                )
+                if page['ids']:
+                    if reencode:
+                        embeddings = self._encode(page['documents'])
+                    else:
+                        embeddings = _normalize(page['embeddings'])
+                    fresh.add(
+                        ids=page['ids'],
+                        embeddings=embeddings.tolist(),
+                        metadatas=page['metadatas'],
+                        documents=page['documents']
+                    )
+                    copied += len(page['ids'])
+                if len(page['ids']) < page_size:
+                    break
+            
+            # Swap before dropping the original: readers don't take the lock
+            # and must never see a deleted collection
+            self.collection = fresh
+            self.client.delete_collection(COLLECTION_NAME)
+            fresh.modify(name=COLLECTION_NAME)
+        logger.info("Rebuilt vector collection", extra={"documents": copied, "reencoded": reencode})
+        return copied
+    
+    def _recover_rebuild(self):
+        """Finish a rebuild that died between dropping the old collection and renaming the copy"""
+        names = {collection.name for collection in self.client.list_collections()}
+        if REBUILD_COLLECTION_NAME not in names:
+            return
+        if COLLECTION_NAME in names:
+            # Died while copying; the original is intact
+            self.client.delete_collection(REBUILD_COLLECTION_NAME)
+        else:
+            self.client.get_collection(REBUILD_COLLECTION_NAME).modify(name=COLLECTION_NAME)
+            logger.warning("Recovered vector collection from an interrupted rebuild")
     
     def search_similar(self, query: str, top_k: int = 3) -> List[Dict]:
-        """Search for similar emails"""
-        query_embedding = self.embedding_model.encode(query)
+        """Search for similar emails; distance is cosine distance (1 - cosine similarity)"""
+        with observe(EMBEDDING_LATENCY, operation="search"):
+            query_embedding = self._encode(query)
         
         if self.db_type == "chromadb":
-            results = self.collection.query(
-                query_embeddings=[query_embedding.tolist()],
-                n_results=top_k
-            )
+            with observe(VECTOR_LATENCY, backend=self.db_type, operation="search"):
+                results = self.collection.query(
+                    query_embeddings=[query_embedding.tolist()],
+                    n_results=top_k
+                )
             return [
                 {
                     "id": results['ids'][0][i],
@@ -62,18 +278,53 @@ class VectorDBService:
                 for i in range(len(results['ids'][0]))
             ]
         elif self.db_type == "faiss":
-            distances, indices = self.index.search(
-                np.array([query_embedding]), top_k
-            )
+            with observe(VECTOR_LATENCY, backend=self.db_type, operation="search"):
+                scores, indices = self.index.search(
+                    query_embedding.reshape(1, -1), top_k
+                )
+            keys = list(self.metadata_store.keys())
+            # FAISS pads with -1 when the index holds fewer than top_k vectors
             return [
                 {
-                    "id": list(self.metadata_store.keys())[idx],
-                    "content": self.metadata_store[list(self.metadata_store.keys())[idx]]["content"],
-                    "distance": float(distances[0][i])
+                    "id": keys[idx],
+                    "content": self.metadata_store[keys[idx]]["content"],
+                    "distance": 1.0 - float(scores[0][i])
                 }
                 for i, idx in enumerate(indices[0])
+                if idx >= 0
             ]
     
+    def extract_key_sentences(self, text: str, max_tokens: int) -> str:
+        """Extractive summary of text within max_tokens
+        
+        Sentences are ranked by cosine similarity to the whole-text centroid
+        and the best ones that fit the budget are kept in original order.
+        """
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        
+        sentences = split_sentences(text)
+        if len(sentences) < 2:
+            return truncate_to_token_budget(text, max_tokens)
+        
+        with observe(EMBEDDING_LATENCY, operation="key_sentences"):
+            embeddings = self._encode(sentences)
+        centroid = embeddings.mean(axis=0)
+        scores = embeddings @ centroid
+        
+        selected = []
+        used = 0
+        for idx in np.argsort(-scores):
+            cost = estimate_tokens(sentences[idx]) + 1
+            if used + cost > max_tokens:
+                continue
+            selected.append(idx)
+            used += cost
+        
+        if not selected:
+            return truncate_to_token_budget(text, max_tokens)
+        return " ".join(sentences[i] for i in sorted(selected))
+    
     def get_all_emails(self) -> List[Dict]:
         """Retrieve all stored emails"""
         if self.db_type == "chromadb":
@@ -87,6 +338,9 @@ class VectorDBService:
                 for i in range(len(results['ids']))
             ]
         elif self.db_type == "faiss":
-            return list(self.metadata_store.values())
+            return [
+                {"id": email_id, **stored}
+                for email_id, stored in self.metadata_store.items()
+            ]
 
 vector_db = VectorDBService()
\ No newline at end of file
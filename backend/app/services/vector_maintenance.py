@@ -0,0 +1,178 @@
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app.services.metrics import VECTOR_DOCUMENTS, VECTOR_DISK_BYTES, VECTOR_COMPACTION_REMOVED
+from app.services.vector_db import vector_db
+from app.utils.near_duplicate import find_near_duplicates
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import os
+import resource
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+def directory_size(path: str) -> int:
+    """Total size in bytes of the files under path (0 if it doesn't exist)"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def process_rss_bytes() -> int:
+    """Current resident set size, or the peak where /proc is unavailable"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class VectorStoreMaintenance:
+    """Retention and compaction for the vector store
+
+    Each compaction drops, in order: entries older than VECTOR_MAX_AGE_DAYS,
+    near-duplicates among each user's entries (if VECTOR_COMPACTION_DEDUPE,
+    keeping the newest copy), each user's oldest entries beyond
+    VECTOR_MAX_PER_USER, then the oldest entries beyond VECTOR_MAX_DOCUMENTS. Once deletions since the last
+    rebuild reach VECTOR_REBUILD_FRACTION of the store, the index is rebuilt
+    so its size and query latency track the live entries.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self.lock = threading.Lock()
+        self.deleted_since_rebuild = 0
+        self.last_report: Optional[Dict] = None
+
+    @staticmethod
+    def select_expired(entries: List[Dict], now: Optional[datetime] = None) -> Dict[str, List[str]]:
+        """Ids to remove under the retention settings, by reason
+
+        entries are vector_db.list_entries() dicts (with content when
+        deduplicating). Entries without created_at never expire by age and
+        count as oldest for the size caps.
+        """
+        now = now or datetime.now()
+        created = {entry['id']: str(entry['metadata'].get('created_at') or '') for entry in entries}
+        newest_first = sorted(entries, key=lambda entry: created[entry['id']], reverse=True)
+        removed: Dict[str, List[str]] = {'age': [], 'duplicate': [], 'user_cap': [], 'max_documents': []}
+
+        if settings.VECTOR_MAX_AGE_DAYS:
+            cutoff = (now - timedelta(days=settings.VECTOR_MAX_AGE_DAYS)).isoformat()
+            removed['age'] = [e['id'] for e in newest_first if created[e['id']] and created[e['id']] < cutoff]
+        gone = set(removed['age'])
+
+        if settings.VECTOR_COMPACTION_DEDUPE:
+            # Per user: another user's copy of the same email is their own context
+            by_user: Dict[str, List[Dict]] = {}
+            for entry in newest_first:
+                if entry['id'] not in gone and entry.get('content'):
+                    by_user.setdefault(entry['metadata'].get('user_id', ''), []).append(entry)
+            for user_entries in by_user.values():
+                duplicates = find_near_duplicates(
+                    ((e['id'], e['content']) for e in user_entries),
+                    threshold=settings.NEAR_DUPLICATE_THRESHOLD,
+                    min_words=settings.NEAR_DUPLICATE_MIN_WORDS
+                )
+                removed['duplicate'].extend(duplicates)
+            gone.update(removed['duplicate'])
+
+        if settings.VECTOR_MAX_PER_USER:
+            per_user: Dict[str, int] = {}
+            for entry in newest_first:
+                if entry['id'] in gone:
+                    continue
+                user_id = entry['metadata'].get('user_id', '')
+                per_user[user_id] = per_user.get(user_id, 0) + 1
+                if per_user[user_id] > settings.VECTOR_MAX_PER_USER:
+                    removed['user_cap'].append(entry['id'])
+            gone.update(removed['user_cap'])
+
+        if settings.VECTOR_MAX_DOCUMENTS:
+            live = [entry['id'] for entry in newest_first if entry['id'] not in gone]
+            removed['max_documents'] = live[settings.VECTOR_MAX_DOCUMENTS:]
+
+        return removed
+
+    def compact(self, rebuild: Optional[bool] = None) -> Dict:
+        """Apply retention now; rebuild=None rebuilds only past VECTOR_REBUILD_FRACTION"""
+        with self.lock:
+            started = datetime.now()
+            entries = vector_db.list_entries(include_content=settings.VECTOR_COMPACTION_DEDUPE)
+            removed = self.select_expired(entries, started)
+
+            deleted = 0
+            victims = [email_id for ids in removed.values() for email_id in ids]
+            for i in range(0, len(victims), 1000):
+                deleted += vector_db.delete_emails(victims[i:i + 1000])
+            for reason, ids in removed.items():
+                if ids:
+                    VECTOR_COMPACTION_REMOVED.labels(reason=reason).inc(len(ids))
+
+            self.deleted_since_rebuild += deleted
+            if rebuild is None:
+                rebuild = self.deleted_since_rebuild > 0 and (
+                    self.deleted_since_rebuild >= settings.VECTOR_REBUILD_FRACTION * max(len(entries), 1)
+                )
+            rebuilt = False
+            if rebuild:
+                rebuilt = vector_db.rebuild() is not None
+                self.deleted_since_rebuild = 0
+
+            self.last_report = {
+                'started_at': started.isoformat(),
+                'seconds': round((datetime.now() - started).total_seconds(), 3),
+                'scanned': len(entries),
+                'removed': {reason: len(ids) for reason, ids in removed.items()},
+                'deleted': deleted,
+                'rebuilt': rebuilt,
+                **self.stats()
+            }
+        logger.info("Vector store compaction finished", extra=self.last_report)
+        return self.last_report
+
+    def stats(self) -> Dict:
+        """Document count, on-disk size of VECTOR_DB_PATH and this process's RSS"""
+        documents = vector_db.count()
+        disk_bytes = directory_size(settings.VECTOR_DB_PATH) if vector_db.db_type == "chromadb" else 0
+        VECTOR_DOCUMENTS.set(documents)
+        VECTOR_DISK_BYTES.set(disk_bytes)
+        return {
+            'backend': vector_db.db_type,
+            'documents': documents,
+            'disk_bytes': disk_bytes,
+            'rss_bytes': process_rss_bytes()
+        }
+
+    async def _compaction_loop(self):
+        while True:
+            await asyncio.sleep(settings.VECTOR_COMPACTION_INTERVAL)
+            try:
+                await run_in_threadpool(self.compact)
+            except Exception as e:
+                logger.exception("Vector store compaction failed: %s", e)
+
+    async def start(self):
+        """Start periodic compaction if VECTOR_COMPACTION_INTERVAL is set"""
+        if settings.VECTOR_COMPACTION_INTERVAL > 0:
+            self.task = asyncio.create_task(self._compaction_loop())
+            logger.info("Vector store compaction every %ds", settings.VECTOR_COMPACTION_INTERVAL)
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+vector_maintenance = VectorStoreMaintenance()
@@ -1,7 +1,82 @@
 import re
-from bs4 import BeautifulSoup
-from typing import Dict, Optional
+from bs4 import BeautifulSoup, UnicodeDammit
+from typing import Dict, Iterable, List, Optional
 import mailparser
+from app.config import settings
+from app.utils.keywords import categorize_lowered, topics_lowered
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Amounts, numeric dates and phone numbers in one pass; the lookahead lets the
+# regex engine skip straight to characters that can start one of them
+_NUMERIC_ENTITIES = re.compile(
+    r'(?=[$\d+(])(?:'
+    r'(?P<amount>\$[\d,]+(?:\.\d{2})?)'
+    r'|(?P<slash_date>\d{1,2}/\d{1,2}/\d{2,4})'
+    r'|(?P<iso_date>\d{4}-\d{2}-\d{2})'
+    r'|(?P<phone>(?:\+\d{1,2}\s?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4})'
+    r')'
+)
+# Matched against lowercased text; IGNORECASE defeats the regex engine's prefix scan
+_MONTH_DATE = re.compile(r'(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]* \d{1,2},? \d{4}')
+_MONTH_DATE_ANYCASE = re.compile(_MONTH_DATE.pattern, re.IGNORECASE)
+_ENTITY_PLACEHOLDERS = {
+    'amount': ' <amount> ', 'slash_date': ' <date> ', 'iso_date': ' <date> ', 'phone': ' <phone> '
+}
+_EMAIL_ADDRESS = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+
+_lxml_parser = None
+
+def normalize_whitespace(text: str) -> str:
+    """Join the stripped pieces of text split on line breaks and double spaces
+    
+    Equivalent to stripping every line, splitting it on "  ", stripping each
+    piece and joining the non-empty ones with a space, but as one split with
+    the per-piece work done by C string methods.
+    """
+    return ' '.join(filter(None, map(str.strip, '  '.join(text.splitlines()).split('  '))))
+
+def _html_text_bs4(html: str) -> str:
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.decompose()
+    
+    return soup.get_text()
+
+def _html_text_lxml(html: str) -> str:
+    global _lxml_parser
+    from lxml import etree
+    
+    if _lxml_parser is None:
+        _lxml_parser = etree.HTMLParser(remove_comments=True, remove_pis=True, huge_tree=True)
+    if not html.strip():
+        return ''
+    root = etree.fromstring(html, _lxml_parser)
+    if root is None:
+        return ''
+    etree.strip_elements(root, 'script', 'style', with_tail=False)
+    # XPath string() concatenates every text node in C
+    return root.xpath('string()')
+
+def html_to_text(html: str, backend: Optional[str] = None) -> str:
+    """Visible text of an HTML document with whitespace normalized
+    
+    backend is "lxml" or "bs4" (default: EMAIL_HTML_PARSER). lxml falls back
+    to BeautifulSoup when it is not installed or cannot parse the input.
+    Both backends yield the same text except that lxml drops <![CDATA[...]]>
+    sections, which BeautifulSoup's html.parser keeps.
+    """
+    backend = backend or settings.EMAIL_HTML_PARSER
+    if backend == "lxml":
+        try:
+            return normalize_whitespace(_html_text_lxml(html))
+        except Exception as e:
+            logger.debug("lxml could not parse HTML, falling back to BeautifulSoup", extra={"error": str(e)})
+    return normalize_whitespace(_html_text_bs4(html))
 
 class EmailParser:
     """Parse and extract content from emails"""
@@ -37,26 +112,12 @@ class EmailParser:
         }
     
     @staticmethod
-    def parse_html(html: str) -> Dict[str, str]:
+    def parse_html(html: str, backend: Optional[str] = None) -> Dict[str, str]:
         """Parse HTML email"""
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        # Get text
-        text = soup.get_text()
-        
-        # Clean up whitespace
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
-        
         return {
             'subject': '',
             'sender': '',
-            'content': text,
+            'content': html_to_text(html, backend),
             'is_html': True
         }
     
@@ -74,7 +135,7 @@ class EmailParser:
                 'attachments': [att['filename'] for att in mail.attachments] if mail.attachments else []
             }
         except Exception as e:
-            print(f"Error parsing email file: {e}")
+            logger.warning("Error parsing email file", extra={"file_path": file_path, "error": str(e)})
             return {
                 'subject': '',
                 'sender': '',
@@ -83,56 +144,118 @@ class EmailParser:
             }
     
     @staticmethod
-    def extract_key_info(email_content: str) -> Dict[str, any]:
-        """Extract key information from email"""
-        # Extract amounts (donations)
-        amounts = re.findall(r'\$[\d,]+(?:\.\d{2})?', email_content)
+    def parse_email_bytes(raw: bytes) -> Dict[str, str]:
+        """Parse a raw RFC 822 message; HTML-only bodies are reduced to text"""
+        mail = mailparser.parse_from_bytes(raw)
+        if mail.text_plain:
+            content = mail.text_plain[0]
+        elif mail.text_html:
+            content = html_to_text(mail.text_html[0])
+        else:
+            content = ''
         
-        # Extract dates
-        date_patterns = [
-            r'\d{1,2}/\d{1,2}/\d{2,4}',
-            r'\d{4}-\d{2}-\d{2}',
-            r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* \d{1,2},? \d{4}'
-        ]
-        dates = []
-        for pattern in date_patterns:
-            dates.extend(re.findall(pattern, email_content, re.IGNORECASE))
+        return {
+            'message_id': mail.message_id or '',
+            'subject': mail.subject or '',
+            'sender': mail.from_[0][1] if mail.from_ else '',
+            'content': content.strip(),
+            'date': mail.date.isoformat() if mail.date else ''
+        }
+    
+    @staticmethod
+    def parse_upload(raw: bytes, filename: str = '', content_type: str = '') -> Dict[str, str]:
+        """Parse an uploaded .eml or HTML file by extension, falling back to content type
         
-        # Extract email addresses
-        emails = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', email_content)
+        Raises ValueError for any other kind of file.
+        """
+        extension = filename.lower().rsplit('.', 1)[-1] if '.' in filename else ''
+        content_type = content_type.split(';')[0].strip().lower()
         
-        # Extract phone numbers
-        phones = re.findall(r'(?:\+\d{1,2}\s?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}', email_content)
+        if extension == 'eml' or (not extension and content_type == 'message/rfc822'):
+            return EmailParser.parse_email_bytes(raw)
+        if extension in ('html', 'htm') or (not extension and content_type == 'text/html'):
+            # Honours a BOM or <meta charset>, then guesses
+            return EmailParser.parse_html(UnicodeDammit(raw, is_html=True).unicode_markup or '')
+        raise ValueError("Only .eml and .html files are supported")
+    
+    @staticmethod
+    def parse_for_ingest(raw: bytes) -> Optional[Dict[str, any]]:
+        """Parse a raw message and extract its key info, for bulk ingestion workers
         
-        # Detect intent/category
-        category = EmailParser.categorize_email(email_content)
+        Runs in a worker process, so it returns plain data and never raises:
+        unparseable messages come back as None. 'digest' identifies the
+        message (its Message-ID, or its bytes when it has none).
+        """
+        try:
+            parsed = EmailParser.parse_email_bytes(raw)
+        except Exception as e:
+            logger.debug("Could not parse message", extra={"error": str(e)})
+            return None
         
+        identity = parsed['message_id'].encode() if parsed['message_id'] else raw
+        return {
+            **parsed,
+            'digest': hashlib.sha256(identity).hexdigest(),
+            'key_info': EmailParser.extract_key_info(parsed['content'])
+        }
+    
+    @staticmethod
+    def extract_key_info(email_content: str) -> Dict[str, any]:
+        """Extract key information from email"""
+        content_lower = email_content.lower()
         return {
-            'amounts': amounts,
-            'dates': dates,
-            'emails': emails,
-            'phones': phones,
-            'category': category,
+            **EmailParser._extract_entities(email_content, content_lower),
+            'category': categorize_lowered(content_lower),
+            'topics': topics_lowered(content_lower),
             'word_count': len(email_content.split())
         }
     
     @staticmethod
-    def categorize_email(content: str) -> str:
-        """Categorize email based on content"""
-        content_lower = content.lower()
+    def extract_key_info_batch(email_contents: Iterable[str]) -> List[Dict[str, any]]:
+        """extract_key_info over many emails"""
+        return [EmailParser.extract_key_info(content) for content in email_contents]
+    
+    @staticmethod
+    def _extract_entities(email_content: str, content_lower: str) -> Dict[str, List[str]]:
+        """Amounts, dates, email addresses and phone numbers
         
-        categories = {
-            'donation_request': ['donate', 'donation', 'contribute', 'support', 'give'],
-            'thank_you': ['thank you', 'grateful', 'appreciation', 'thanks'],
-            'event_invitation': ['event', 'invitation', 'join us', 'please attend'],
-            'volunteer_request': ['volunteer', 'help needed', 'join our team'],
-            'impact_report': ['impact', 'results', 'outcomes', 'achievements'],
-            'grant_notification': ['grant', 'funding', 'award'],
-            'general_update': ['update', 'news', 'announcement']
-        }
+        An amount long enough to look like a phone number is reported only as
+        an amount. Dates are ordered: slash dates, ISO dates, month-name dates.
+        """
+        found = {'amount': [], 'slash_date': [], 'iso_date': [], 'phone': []}
+        for match in _NUMERIC_ENTITIES.finditer(email_content):
+            found[match.lastgroup].append(match.group(match.lastgroup))
         
-        for category, keywords in categories.items():
-            if any(keyword in content_lower for keyword in keywords):
-                return category
+        # Spans carry over only if lowercasing kept every character's length
+        if len(content_lower) == len(email_content):
+            month_dates = [email_content[m.start():m.end()] for m in _MONTH_DATE.finditer(content_lower)]
+        else:
+            month_dates = _MONTH_DATE_ANYCASE.findall(email_content)
+        
+        return {
+            'amounts': found['amount'],
+            'dates': found['slash_date'] + found['iso_date'] + month_dates,
+            'emails': _EMAIL_ADDRESS.findall(email_content) if '@' in email_content else [],
+            'phones': found['phone']
+        }
+    
+    @staticmethod
+    def mask_entities(email_content: str) -> str:
+        """Lowercased email_content with the entities extract_key_info finds replaced
         
-        return 'general'
\ No newline at end of file
+        Amounts, dates, phone numbers and email addresses become <amount>,
+        <date>, <phone> and <email>, so emails that differ only in those
+        compare equal.
+        """
+        text = _NUMERIC_ENTITIES.sub(
+            lambda m: _ENTITY_PLACEHOLDERS[m.lastgroup], email_content.lower()
+        )
+        text = _MONTH_DATE.sub(' <date> ', text)
+        if '@' in text:
+            text = _EMAIL_ADDRESS.sub(' <email> ', text)
+        return text
+    
+    @staticmethod
+    def categorize_email(content: str) -> str:
+        """Categorize email based on content"""
+        return categorize_lowered(content.lower())
@@ -1,8 +1,11 @@
 from typing import Dict, List, Any
 import json
-from datetime import datetime
+import math
+import re
+from datetime import datetime, timezone
 import hashlib
 import secrets
+from app.utils.keywords import topics_lowered
 
 def generate_id(prefix: str = "") -> str:
     """Generate unique ID with optional prefix"""
@@ -19,6 +22,15 @@ def format_datetime(dt: datetime) -> str:
     """Format datetime to ISO string"""
     return dt.isoformat() if dt else None
 
+def utc_timestamp(dt: datetime = None) -> str:
+    """UTC ISO string with a "Z" suffix, as pydantic serializes aware datetimes
+
+    Strings in this one format sort chronologically, which Firebase
+    queries and comparisons on stored timestamps rely on.
+    """
+    dt = dt or datetime.now(timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
 def parse_datetime(date_str: str) -> datetime:
     """Parse ISO datetime string"""
     try:
@@ -42,29 +54,43 @@ def sanitize_email_content(content: str) -> str:
         content = content[:max_length] + "..."
     return content
 
-def extract_topics_from_text(text: str) -> List[str]:
-    """Extract potential topics from text (simple version)"""
-    keywords = {
-        'donation': 'fundraising',
-        'donor': 'donor_relations',
-        'volunteer': 'volunteer_management',
-        'impact': 'impact_measurement',
-        'grant': 'grant_writing',
-        'budget': 'financial_management',
-        'program': 'program_development',
-        'community': 'community_engagement',
-        'marketing': 'marketing_outreach',
-        'event': 'event_planning'
-    }
+# Sentence ends: terminal punctuation or blank lines
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+def estimate_tokens(text: str) -> int:
+    """Estimate LLM tokens locally (~4 characters per token for English)"""
+    return math.ceil(len(text) / 4)
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences"""
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s and s.strip()]
+
+def truncate_to_token_budget(text: str, max_tokens: int) -> str:
+    """Trim text to max_tokens at a sentence boundary
+    
+    Falls back to a word boundary when the first sentence alone is over budget.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
     
-    text_lower = text.lower()
-    found_topics = set()
+    kept = []
+    used = 0
+    for sentence in split_sentences(text):
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
     
-    for keyword, topic in keywords.items():
-        if keyword in text_lower:
-            found_topics.add(topic)
+    if kept:
+        return " ".join(kept)
     
-    return list(found_topics) if found_topics else ['general']
+    max_chars = max_tokens * 4
+    return text[:max_chars].rsplit(" ", 1)[0] + "..."
+
+def extract_topics_from_text(text: str) -> List[str]:
+    """Extract potential topics from text (simple version)"""
+    return topics_lowered(text.lower())
 
 def format_quiz_for_frontend(quiz: Any) -> Dict:
     """Format quiz object for frontend consumption"""
@@ -0,0 +1,42 @@
+from typing import Dict, List
+
+# Checked in order; the first category with a matching keyword wins
+CATEGORY_KEYWORDS: Dict[str, List[str]] = {
+    'donation_request': ['donate', 'donation', 'contribute', 'support', 'give'],
+    'thank_you': ['thank you', 'grateful', 'appreciation', 'thanks'],
+    'event_invitation': ['event', 'invitation', 'join us', 'please attend'],
+    'volunteer_request': ['volunteer', 'help needed', 'join our team'],
+    'impact_report': ['impact', 'results', 'outcomes', 'achievements'],
+    'grant_notification': ['grant', 'funding', 'award'],
+    'general_update': ['update', 'news', 'announcement']
+}
+
+TOPIC_KEYWORDS: Dict[str, str] = {
+    'donation': 'fundraising',
+    'donor': 'donor_relations',
+    'volunteer': 'volunteer_management',
+    'impact': 'impact_measurement',
+    'grant': 'grant_writing',
+    'budget': 'financial_management',
+    'program': 'program_development',
+    'community': 'community_engagement',
+    'marketing': 'marketing_outreach',
+    'event': 'event_planning'
+}
+
+# Flattened once so per-call work is only the substring tests
+_CATEGORY_TABLE = tuple((category, tuple(words)) for category, words in CATEGORY_KEYWORDS.items())
+_TOPIC_TABLE = tuple(TOPIC_KEYWORDS.items())
+
+def categorize_lowered(text_lower: str) -> str:
+    """Category of already-lowercased text, or 'general'"""
+    for category, words in _CATEGORY_TABLE:
+        for word in words:
+            if word in text_lower:
+                return category
+    return 'general'
+
+def topics_lowered(text_lower: str) -> List[str]:
+    """Topics mentioned in already-lowercased text, or ['general']"""
+    found = {topic for word, topic in _TOPIC_TABLE if word in text_lower}
+    return list(found) if found else ['general']
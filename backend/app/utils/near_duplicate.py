@@ -0,0 +1,144 @@
+from app.utils.email_parser import EmailParser
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import operator
+import re
+
+# Words, entity placeholders, and any number the entity patterns didn't claim
+_TOKEN = re.compile(r'<\w+>|[^\W\d_]+|\d+')
+_DIGITS = re.compile(r'\d+')
+
+SHINGLE_SIZE = 3
+NUM_BINS = 64
+BAND_ROWS = 4
+_BIN_BITS = 6  # log2(NUM_BINS)
+_EMPTY = 1 << 64
+# Added per bin skipped when an empty bin borrows a neighbour's minimum
+_ROTATION_OFFSET = 1 << 58
+
+Signature = Tuple[int, ...]
+
+def _shingle_hash(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big')
+
+def email_tokens(email_content: str) -> List[str]:
+    """Tokens of an email with entities masked and stray numbers collapsed to #"""
+    return [_DIGITS.sub('#', token) for token in _TOKEN.findall(EmailParser.mask_entities(email_content))]
+
+def minhash(tokens: List[str]) -> Signature:
+    """MinHash signature of the word shingles of tokens
+
+    One-permutation hashing: each shingle is hashed once, the low bits pick
+    one of NUM_BINS bins and the bin keeps its minimum, so the cost is one
+    hash per shingle rather than one per shingle per permutation. Empty bins
+    (short emails) borrow the next non-empty bin's value plus an offset, which
+    keeps equal-bin probability equal to the Jaccard similarity.
+    """
+    if len(tokens) < SHINGLE_SIZE:
+        shingles = {' '.join(tokens)}
+    else:
+        shingles = {' '.join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+    bins = [_EMPTY] * NUM_BINS
+    for shingle in shingles:
+        h = _shingle_hash(shingle)
+        b = h & (NUM_BINS - 1)
+        value = h >> _BIN_BITS
+        if value < bins[b]:
+            bins[b] = value
+
+    if _EMPTY in bins:
+        if bins.count(_EMPTY) == NUM_BINS:
+            return tuple(bins)
+        dense = list(bins)
+        for b in range(NUM_BINS):
+            if bins[b] == _EMPTY:
+                steps = next(s for s in range(1, NUM_BINS) if bins[(b + s) % NUM_BINS] != _EMPTY)
+                dense[b] = bins[(b + steps) % NUM_BINS] + steps * _ROTATION_OFFSET
+        return tuple(dense)
+    return tuple(bins)
+
+def email_signature(email_content: str) -> Signature:
+    return minhash(email_tokens(email_content))
+
+def jaccard_estimate(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(map(operator.eq, a, b)) / NUM_BINS
+
+class NearDuplicateIndex:
+    """MinHash LSH index with constant-time near-duplicate lookup
+
+    Signatures are cut into bands of BAND_ROWS bins; candidates are entries
+    sharing at least one whole band (one dict get per band), confirmed by
+    their estimated Jaccard similarity. With 16 bands of 4, a pair at
+    similarity 0.8 becomes a candidate with probability > 0.999, a pair at
+    0.3 about 12% of the time. Holds up to max_entries, evicting the oldest.
+    """
+
+    def __init__(self, threshold: float = 0.8, max_entries: int = 10000):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[int, Tuple[Signature, Any]]" = OrderedDict()
+        self.bands: List[Dict[Signature, set]] = [{} for _ in range(NUM_BINS // BAND_ROWS)]
+        self._next_id = 0
+
+    @staticmethod
+    def _band_keys(signature: Signature):
+        for band in range(NUM_BINS // BAND_ROWS):
+            yield band, signature[band * BAND_ROWS:(band + 1) * BAND_ROWS]
+
+    def find(self, signature: Signature) -> Optional[Any]:
+        """Value of the most similar indexed entry at or above threshold, or None"""
+        best, best_similarity = None, self.threshold
+        seen = set()
+        for band, key in self._band_keys(signature):
+            for entry_id in self.bands[band].get(key, ()):
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                other, value = self.entries[entry_id]
+                similarity = jaccard_estimate(signature, other)
+                if similarity >= best_similarity:
+                    best, best_similarity = value, similarity
+        return best
+
+    def add(self, signature: Signature, value: Any):
+        """Index a signature with the value find() returns for its near-duplicates"""
+        entry_id = self._next_id
+        self._next_id += 1
+        self.entries[entry_id] = (signature, value)
+        for band, key in self._band_keys(signature):
+            self.bands[band].setdefault(key, set()).add(entry_id)
+
+        while len(self.entries) > self.max_entries:
+            old_id, (old_signature, _) = self.entries.popitem(last=False)
+            for band, key in self._band_keys(old_signature):
+                bucket = self.bands[band][key]
+                bucket.discard(old_id)
+                if not bucket:
+                    del self.bands[band][key]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+def find_near_duplicates(emails: Iterable[Tuple[str, str]], threshold: float = 0.8,
+                         min_words: int = 20) -> Dict[str, str]:
+    """Map the id of every near-duplicate email to the id of the email it duplicates
+
+    emails is (id, content) pairs; the first email of each cluster is kept.
+    Emails shorter than min_words tokens are never matched.
+    """
+    index = NearDuplicateIndex(threshold, max_entries=float('inf'))
+    duplicates = {}
+    for email_id, content in emails:
+        tokens = email_tokens(content)
+        if len(tokens) < min_words:
+            continue
+        signature = minhash(tokens)
+        kept_id = index.find(signature)
+        if kept_id is None:
+            index.add(signature, email_id)
+        else:
+            duplicates[email_id] = kept_id
+    return duplicates
@@ -0,0 +1,66 @@
+"""Small timing helpers shared by the microbenchmarks"""
+
+import contextlib
+import os
+import statistics
+import time
+from typing import Callable, Dict, List
+
+def measure(fn: Callable, rounds: int = 20, min_time: float = 0.05, warmup: int = 1) -> Dict[str, float]:
+    """Time fn() like pytest-benchmark: each round loops until min_time, stats are per call
+
+    Returns min/median/mean/stddev in seconds plus ops (calls per second at the median).
+    """
+    for _ in range(warmup):
+        fn()
+
+    # Calibrate how many calls make up one round
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - t0 >= min_time or loops >= 1_000_000:
+            break
+        loops *= 2
+
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - t0) / loops)
+
+    median = statistics.median(samples)
+    return {
+        'min': min(samples),
+        'median': median,
+        'mean': statistics.fmean(samples),
+        'stddev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'ops': 1 / median if median else float('inf'),
+        'rounds': rounds,
+        'loops': loops,
+    }
+
+@contextlib.contextmanager
+def quiet():
+    """Discard stdout from the code under test (it still pays for the writes)"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def print_table(title: str, rows: List[tuple]):
+    """rows: (name, stats) pairs from measure()"""
+    print(f"\n{title}")
+    print(f"  {'name':<48} {'min':>11} {'median':>11} {'mean':>11} {'stddev':>11} {'ops/s':>12}")
+    for name, stats in rows:
+        print(f"  {name:<48} "
+              f"{format_seconds(stats['min']):>11} {format_seconds(stats['median']):>11} "
+              f"{format_seconds(stats['mean']):>11} {format_seconds(stats['stddev']):>11} "
+              f"{stats['ops']:>12,.1f}")
+
+def format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.3f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.3f} ms"
+    return f"{seconds * 1e6:.2f} us"
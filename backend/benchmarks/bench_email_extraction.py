@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark EmailParser.extract_key_info, categorize_email and
+extract_topics_from_text on a synthetic donor-email corpus
+
+Compares the current extractor (one combined pass for amounts, numeric dates
+and phones, case-sensitive month-date matching on lowercased text, one
+lowercase shared by categorization and topics) against the previous
+implementation, and reports how many emails produce different output.
+
+Usage (from backend/):
+    python -m benchmarks.bench_email_extraction --emails 20000
+"""
+
+import argparse
+import random
+import re
+import time
+
+from app.utils.email_parser import EmailParser
+from app.utils.helpers import extract_topics_from_text
+
+GREETINGS = ["Dear {name},", "Hi {name},", "Hello {name},", "Dear Friend,"]
+BODIES = [
+    "Thank you for your generous gift of ${amount:,}.00 on {month}/{day}/{year}. We are grateful for your support.",
+    "Please join us for our annual gala on {month_name} {day}, {year}. RSVP to events@{org}.org or call ({area}) {mid}-{end}.",
+    "Our impact report shows outcomes across {n} programs this year, with achievements in every community we serve.",
+    "We are seeking volunteers for the food drive on {year}-{month:02d}-{day:02d}. Help needed with sorting and delivery.",
+    "We are pleased to announce a grant award of ${amount:,} from the {org} Foundation to expand our budget for outreach.",
+    "Your monthly donation keeps our literacy program running. Contact {name_lower}@{org}.org with any questions.",
+    "News and updates: our marketing team launched a new campaign, and donor retention rose {n}% this quarter.",
+    "Every contribution matters. Text GIVE to {area}{mid}{end} or visit our site to donate today.",
+]
+NAMES = ["Maria", "James", "Aisha", "Chen", "Olivia", "Noah", "Priya", "Lucas"]
+ORGS = ["riverside", "hopehouse", "greenfields", "brightfutures", "cityharvest"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August",
+          "September", "October", "November", "December"]
+
+def synthetic_email(rng: random.Random) -> str:
+    name = rng.choice(NAMES)
+    fields = dict(
+        name=name, name_lower=name.lower(), org=rng.choice(ORGS), amount=rng.randint(10, 50_000),
+        month=rng.randint(1, 12), day=rng.randint(1, 28), year=rng.randint(2018, 2025),
+        month_name=rng.choice(MONTHS), area=rng.randint(200, 999), mid=rng.randint(200, 999),
+        end=rng.randint(1000, 9999), n=rng.randint(2, 90)
+    )
+    paragraphs = [rng.choice(GREETINGS).format(**fields)]
+    paragraphs += [rng.choice(BODIES).format(**fields) for _ in range(rng.randint(2, 6))]
+    paragraphs.append(f"With appreciation,\n{rng.choice(NAMES)}\nDevelopment Office")
+    return "\n\n".join(paragraphs)
+
+# ============================================
+# PREVIOUS IMPLEMENTATION
+# ============================================
+
+def legacy_categorize_email(content: str) -> str:
+    content_lower = content.lower()
+    categories = {
+        'donation_request': ['donate', 'donation', 'contribute', 'support', 'give'],
+        'thank_you': ['thank you', 'grateful', 'appreciation', 'thanks'],
+        'event_invitation': ['event', 'invitation', 'join us', 'please attend'],
+        'volunteer_request': ['volunteer', 'help needed', 'join our team'],
+        'impact_report': ['impact', 'results', 'outcomes', 'achievements'],
+        'grant_notification': ['grant', 'funding', 'award'],
+        'general_update': ['update', 'news', 'announcement']
+    }
+    for category, keywords in categories.items():
+        if any(keyword in content_lower for keyword in keywords):
+            return category
+    return 'general'
+
+def legacy_extract_key_info(email_content: str) -> dict:
+    amounts = re.findall(r'\$[\d,]+(?:\.\d{2})?', email_content)
+    date_patterns = [
+        r'\d{1,2}/\d{1,2}/\d{2,4}',
+        r'\d{4}-\d{2}-\d{2}',
+        r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]* \d{1,2},? \d{4}'
+    ]
+    dates = []
+    for pattern in date_patterns:
+        dates.extend(re.findall(pattern, email_content, re.IGNORECASE))
+    emails = re.findall(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', email_content)
+    phones = re.findall(r'(?:\+\d{1,2}\s?)?\(?\d{3}\)?[\s.-]?\d{3}[\s.-]?\d{4}', email_content)
+    return {
+        'amounts': amounts,
+        'dates': dates,
+        'emails': emails,
+        'phones': phones,
+        'category': legacy_categorize_email(email_content),
+        'word_count': len(email_content.split())
+    }
+
+def legacy_extract_topics_from_text(text: str) -> list:
+    keywords = {
+        'donation': 'fundraising', 'donor': 'donor_relations', 'volunteer': 'volunteer_management',
+        'impact': 'impact_measurement', 'grant': 'grant_writing', 'budget': 'financial_management',
+        'program': 'program_development', 'community': 'community_engagement',
+        'marketing': 'marketing_outreach', 'event': 'event_planning'
+    }
+    text_lower = text.lower()
+    found_topics = {topic for keyword, topic in keywords.items() if keyword in text_lower}
+    return list(found_topics) if found_topics else ['general']
+
+# ============================================
+# COMPARISON
+# ============================================
+
+def same_key_info(legacy: dict, current: dict) -> bool:
+    """Equal on every field the legacy implementation returned"""
+    return all(legacy[k] == current[k] for k in legacy)
+
+def timed(fn, corpus) -> float:
+    t0 = time.perf_counter()
+    fn(corpus)
+    return time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emails', type=int, default=20_000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [synthetic_email(rng) for _ in range(args.emails)]
+    size_mb = sum(len(e) for e in corpus) / 1e6
+    print(f"Corpus: {args.emails:,} emails, {size_mb:.1f} MB")
+
+    cases = [
+        ("extract_key_info",
+         lambda c: [legacy_extract_key_info(e) for e in c],
+         EmailParser.extract_key_info_batch),
+        ("categorize_email",
+         lambda c: [legacy_categorize_email(e) for e in c],
+         lambda c: [EmailParser.categorize_email(e) for e in c]),
+        ("extract_topics_from_text",
+         lambda c: [legacy_extract_topics_from_text(e) for e in c],
+         lambda c: [extract_topics_from_text(e) for e in c]),
+    ]
+
+    print(f"\n  {'function':<26} {'legacy':>12} {'current':>12} {'speedup':>9}")
+    for name, legacy_fn, current_fn in cases:
+        legacy = min(timed(legacy_fn, corpus) for _ in range(args.repeat))
+        current = min(timed(current_fn, corpus) for _ in range(args.repeat))
+        print(f"  {name:<26} {legacy * 1e6 / len(corpus):9.1f} us {current * 1e6 / len(corpus):9.1f} us "
+              f"{legacy / current:8.2f}x")
+
+    mismatches = sum(
+        not same_key_info(legacy_extract_key_info(e), EmailParser.extract_key_info(e))
+        or sorted(legacy_extract_topics_from_text(e)) != sorted(extract_topics_from_text(e))
+        for e in corpus
+    )
+    print(f"\nOutput mismatches vs legacy: {mismatches} / {len(corpus):,}")
+
+if __name__ == "__main__":
+    main()
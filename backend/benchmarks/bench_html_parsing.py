@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark EmailParser.parse_html backends on synthetic newsletter-style HTML
+
+Compares the previous implementation (BeautifulSoup html.parser plus
+generator passes for whitespace), the bs4 backend and the lxml backend (both
+with the single-pass whitespace normalizer), and reports how many documents
+the lxml backend extracts differently from BeautifulSoup.
+
+Usage (from backend/):
+    python -m benchmarks.bench_html_parsing --emails 500
+    python -m benchmarks.bench_html_parsing --sections 200   # larger newsletters
+"""
+
+import argparse
+import gc
+import random
+import time
+
+from bs4 import BeautifulSoup
+
+from app.utils.email_parser import EmailParser, normalize_whitespace
+
+HEAD = """<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN" "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml"><head>
+<meta http-equiv="Content-Type" content="text/html; charset=UTF-8" />
+<title>{org} &mdash; {month} Newsletter</title>
+<style type="text/css">
+  body {{ margin: 0; padding: 0; }} table td {{ border-collapse: collapse; }}
+  .btn {{ background: #0a7; color: #fff; }} @media only screen and (max-width: 600px) {{ .col {{ width: 100% !important; }} }}
+</style>
+<!--[if mso]><style>.fallback {{ font-family: Arial; }}</style><![endif]-->
+<script type="text/javascript">var _track = ['open', '{org}'];</script>
+</head>
+<body style="margin:0">
+<div style="display:none;max-height:0">Your {month} update from {org}&nbsp;&zwnj;&nbsp;&zwnj;</div>
+<table role="presentation" width="100%" cellpadding="0" cellspacing="0" border="0"><tr><td align="center">
+<table width="600" class="container">
+"""
+
+SECTIONS = [
+    """<tr><td class="col"><h2 style="font-size:22px">Thanks to you, {n} families ate this week</h2>
+    <p>Dear {name},<br/>Your gift of <strong>${amount:,}</strong> on {month} {day}, {year} made it possible.
+    We&rsquo;re grateful &amp; inspired.</p></td></tr>""",
+    """<tr><td><table width="100%"><tr>
+      <td width="50%"><img src="https://cdn.{org}.org/img/{n}.jpg" alt="Volunteers at the pantry" width="280"/></td>
+      <td width="50%"><p>Volunteer with us on {year}-{mm:02d}-{day:02d}.
+        <a href="https://{org}.org/volunteer?utm_source=email&amp;utm_medium=newsletter" class="btn">Sign up</a></p></td>
+    </tr></table></td></tr>""",
+    """<tr><td><ul>
+      <li>{n} meals served</li>
+      <li>{m} new volunteers</li>
+      <li>Grant award from the {org} Foundation</li>
+    </ul><!-- section end --></td></tr>""",
+    """<tr><td><p>Join us for our annual gala &mdash; RSVP to <a href="mailto:events@{org}.org">events@{org}.org</a>
+    or call ({area}) {mid}-{end}.</p>
+    <p>    Our    program  results   this  quarter   exceeded   every   target.    </p></td></tr>""",
+    """<tr><td><table class="stats"><tr><th>Program</th><th>Outcome</th></tr>
+      <tr><td>Literacy</td><td>{n}% improved</td></tr><tr><td>Meals</td><td>{m},000 served</td></tr>
+    </table></td></tr>""",
+    """<tr><td><blockquote>&ldquo;This community changed my life.&rdquo; &ndash; {name}</blockquote>
+    <p>Donate today: <a href="https://{org}.org/give">{org}.org/give</a></p></td></tr>""",
+]
+
+FOOTER = """<tr><td style="font-size:11px;color:#999"><p>You are receiving this because you donated to {org}.<br/>
+<a href="https://{org}.org/unsubscribe?id={n}">Unsubscribe</a> | <a href="https://{org}.org/prefs">Preferences</a></p>
+<p>{org} &copy; {year} &middot; 123 Main St &middot; Springfield</p></td></tr>
+</table></td></tr></table>
+<img src="https://t.{org}.org/open.gif?u={n}" width="1" height="1" alt=""/>
+</body></html>"""
+
+NAMES = ["Maria", "James", "Aisha", "Chen", "Olivia", "Noah", "Priya", "Lucas"]
+ORGS = ["riverside", "hopehouse", "greenfields", "brightfutures", "cityharvest"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August",
+          "September", "October", "November", "December"]
+
+def synthetic_newsletter(rng: random.Random, sections: int) -> str:
+    fields = dict(
+        name=rng.choice(NAMES), org=rng.choice(ORGS), amount=rng.randint(10, 50_000),
+        month=rng.choice(MONTHS), mm=rng.randint(1, 12), day=rng.randint(1, 28), year=rng.randint(2018, 2025),
+        area=rng.randint(200, 999), mid=rng.randint(200, 999), end=rng.randint(1000, 9999),
+        n=rng.randint(2, 900), m=rng.randint(2, 90)
+    )
+    body = [rng.choice(SECTIONS).format(**fields) for _ in range(sections)]
+    return HEAD.format(**fields) + "\n".join(body) + FOOTER.format(**fields)
+
+def legacy_parse_html(html: str) -> str:
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.decompose()
+    text = soup.get_text()
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+def timed(fn, corpus) -> float:
+    # Discarded soup trees are cyclic; don't bill one case for another's garbage
+    gc.collect()
+    t0 = time.perf_counter()
+    for html in corpus:
+        fn(html)
+    return time.perf_counter() - t0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emails', type=int, default=500)
+    parser.add_argument('--sections', type=int, default=12, help='content sections per newsletter')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [synthetic_newsletter(rng, rng.randint(args.sections // 2 + 1, args.sections * 3 // 2 + 1))
+              for _ in range(args.emails)]
+    size_mb = sum(len(html) for html in corpus) / 1e6
+    print(f"Corpus: {args.emails:,} newsletters, {size_mb:.1f} MB")
+
+    cases = [
+        ("legacy (bs4 + generator passes)", legacy_parse_html),
+        ("bs4 backend", lambda html: EmailParser.parse_html(html, backend="bs4")),
+        ("lxml backend", lambda html: EmailParser.parse_html(html, backend="lxml")),
+    ]
+    print(f"\n  {'implementation':<32} {'per email':>12} {'MB/s':>8} {'speedup':>9}")
+    baseline = None
+    for name, fn in cases:
+        elapsed = min(timed(fn, corpus) for _ in range(args.repeat))
+        baseline = baseline or elapsed
+        print(f"  {name:<32} {elapsed * 1e3 / len(corpus):9.2f} ms {size_mb / elapsed:8.1f} {baseline / elapsed:8.2f}x")
+
+    whitespace_mismatches = sum(
+        legacy_parse_html(html) != EmailParser.parse_html(html, backend="bs4")['content'] for html in corpus
+    )
+    lxml_mismatches = sum(
+        legacy_parse_html(html) != EmailParser.parse_html(html, backend="lxml")['content'] for html in corpus
+    )
+    print(f"\nOutput mismatches vs legacy: bs4 backend {whitespace_mismatches} / {len(corpus):,}, "
+          f"lxml backend {lxml_mismatches} / {len(corpus):,}")
+
+    # Whitespace normalization alone, on the text BeautifulSoup extracts
+    texts = [BeautifulSoup(html, 'html.parser').get_text() for html in corpus[:200]]
+    legacy_ws = lambda text: ' '.join(
+        c for c in (p.strip() for line in text.splitlines() for p in line.strip().split("  ")) if c
+    )
+    legacy_t = min(timed(legacy_ws, texts) for _ in range(args.repeat))
+    current_t = min(timed(normalize_whitespace, texts) for _ in range(args.repeat))
+    print(f"Whitespace normalization: {legacy_t * 1e6 / len(texts):.1f} us -> "
+          f"{current_t * 1e6 / len(texts):.1f} us per email ({legacy_t / current_t:.2f}x)")
+
+if __name__ == "__main__":
+    main()
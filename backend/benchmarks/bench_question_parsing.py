@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for quiz-question parsing on a corpus of raw LLM responses
+
+For each response this times the parser alone (_parse_freetext_questions or
+_parse_structured_questions, by the entry's mode) and the whole
+generate_quiz_questions path with a provider that replays the response, so
+prompt building and validation are included.
+
+The default corpus (benchmarks/data/llm_responses.jsonl) holds the response
+shapes the repair logic handles: clean, pretty-printed, fenced, prose-wrapped,
+truncated and unparseable JSON. Point --corpus at a JSONL file of real
+captures with the same fields (name, mode, response) to benchmark those.
+
+Usage (from backend/):
+    python -m benchmarks.bench_question_parsing
+    python -m benchmarks.bench_question_parsing --corpus captured.jsonl --rounds 50
+"""
+
+import argparse
+import json
+import os
+
+os.environ.setdefault('LLM_PROVIDER', 'fake')
+
+from app.config import settings
+from app.services.llm_providers import LLMProvider
+from app.services.llm_service import LLMService
+from benchmarks._timing import measure, print_table, quiet
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'llm_responses.jsonl')
+
+SAMPLE_EMAIL = (
+    "Dear Friend, thank you for your gift of $250 to our spring appeal. "
+    "Your support provided tutoring for 40 students and kept our reading room open on Saturdays."
+)
+
+class ReplayProvider(LLMProvider):
+    """Returns a fixed response immediately"""
+
+    name = "replay"
+
+    def __init__(self, response: str):
+        self.response = response
+
+    def generate(self, prompt, system_prompt="", temperature=0.7, max_tokens=2000,
+                 cached_content=None, response_schema=None):
+        return self.response
+
+def load_corpus(path: str):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    settings.LLM_REQUESTS_PER_MINUTE = 0
+    settings.LLM_CONTEXT_CACHE = False
+    with quiet():
+        llm = LLMService()
+
+    parsers = {
+        'structured': LLMService._parse_structured_questions,
+        'freetext': LLMService._parse_freetext_questions,
+    }
+
+    parse_rows, full_rows = [], []
+    for entry in corpus:
+        mode, response = entry['mode'], entry['response']
+        label = f"{mode}/{entry['name']} ({len(response):,} chars)"
+        parse = parsers[mode]
+
+        with quiet():
+            parse_rows.append((label, measure(lambda: parse(response), rounds=args.rounds)))
+
+            settings.LLM_STRUCTURED_OUTPUT = mode == 'structured'
+            llm.provider = ReplayProvider(response)
+            full_rows.append((label, measure(
+                lambda: llm.generate_quiz_questions(SAMPLE_EMAIL, num_questions=5), rounds=args.rounds
+            )))
+
+    print_table("Parser only", parse_rows)
+    print_table("generate_quiz_questions (replayed response)", full_rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark DatabaseService.get_user_analytics on a seeded SQLite database
+
+Compares the SQL-aggregate implementation against the previous approach of
+loading every QuizResultDB row into Python.
+
+Usage (from backend/):
+    python -m benchmarks.bench_user_analytics --rows 1000000 --users 100
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import Base, User, Quiz, QuizResultDB, DatabaseService
+
+def seed(session, num_rows: int, num_users: int, batch_size: int = 50000):
+    """Insert users, quizzes and num_rows quiz results"""
+    session.execute(insert(User), [
+        {'uid': f'user_{u}', 'email': f'user_{u}@example.org', 'full_name': f'User {u}',
+         'total_quizzes': 0, 'total_score': 0.0, 'average_score': 0.0}
+        for u in range(num_users)
+    ])
+
+    results_blob = [
+        {'question_id': f'q{i}', 'question_text': 'x' * 120, 'selected_answer': 'A',
+         'correct_answer': 'B', 'is_correct': False, 'explanation': 'y' * 600}
+        for i in range(1, 6)
+    ]
+    start = datetime(2024, 1, 1)
+
+    for offset in range(0, num_rows, batch_size):
+        quizzes, results = [], []
+        for n in range(offset, min(offset + batch_size, num_rows)):
+            uid = f'user_{n % num_users}'
+            correct = random.randint(0, 5)
+            quizzes.append({'quiz_id': f'quiz_{n}', 'user_id': uid, 'email_context': '',
+                            'questions_json': [], 'num_questions': 5, 'is_completed': True})
+            results.append({'result_id': f'result_{n}', 'quiz_id': f'quiz_{n}', 'user_id': uid,
+                            'score': correct * 20.0, 'total_questions': 5, 'correct_answers': correct,
+                            'results_json': results_blob, 'summary': 'summary',
+                            'completed_at': start + timedelta(minutes=n)})
+        session.execute(insert(Quiz), quizzes)
+        session.execute(insert(QuizResultDB), results)
+        session.commit()
+        print(f"  seeded {min(offset + batch_size, num_rows):,} / {num_rows:,}")
+
+def legacy_user_analytics(db, uid: str):
+    """Previous implementation: load every result row and sum in Python"""
+    user = db.query(User).filter(User.uid == uid).first()
+    results = db.query(QuizResultDB).filter(
+        QuizResultDB.user_id == uid
+    ).order_by(QuizResultDB.completed_at.desc()).all()
+    total_questions = sum(r.total_questions for r in results)
+    correct_answers = sum(r.correct_answers for r in results)
+    return user, total_questions, correct_answers, results[:10]
+
+def time_call(fn, session_factory, uids, repeat: int) -> float:
+    """Average seconds per call over repeat calls for each uid"""
+    elapsed = 0.0
+    for _ in range(repeat):
+        for uid in uids:
+            db = session_factory()
+            try:
+                t0 = time.perf_counter()
+                fn(db, uid)
+                elapsed += time.perf_counter() - t0
+            finally:
+                db.close()
+    return elapsed / (repeat * len(uids))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--db', default=None, help='SQLite file to (re)use; seeded if missing')
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.gettempdir(), f'quizbot_bench_{args.rows}.db')
+    engine = create_engine(f'sqlite:///{path}')
+    session_factory = sessionmaker(bind=engine)
+
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        print(f"Seeding {args.rows:,} results for {args.users} users into {path}...")
+        Base.metadata.create_all(bind=engine)
+        db = session_factory()
+        try:
+            seed(db, args.rows, args.users)
+        finally:
+            db.close()
+
+    uids = [f'user_{u}' for u in random.sample(range(args.users), min(5, args.users))]
+
+    print(f"\nget_user_analytics over {args.rows:,} rows ({args.rows // args.users:,} per user)")
+    legacy = time_call(legacy_user_analytics, session_factory, uids, args.repeat)
+    current = time_call(DatabaseService.get_user_analytics, session_factory, uids, args.repeat)
+    print(f"  legacy (load all rows):  {legacy * 1000:9.2f} ms/call")
+    print(f"  SQL aggregates:          {current * 1000:9.2f} ms/call")
+    print(f"  speedup:                 {legacy / current:9.1f}x")
+
+if __name__ == "__main__":
+    main()
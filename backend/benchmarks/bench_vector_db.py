@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for VectorDBService.add_email and search_similar
+
+Runs each backend (Chroma and FAISS) at several corpus sizes. Embedding time
+is reported separately so changes to the stores themselves are visible
+under the cost of the sentence-transformer.
+
+Usage (from backend/):
+    python -m benchmarks.bench_vector_db --sizes 100 1000 10000
+    python -m benchmarks.bench_vector_db --backends faiss --sizes 50000
+"""
+
+import argparse
+import itertools
+import os
+import random
+import tempfile
+import time
+
+# Keep the module-level vector_db singleton out of the real data directory
+_workdir = tempfile.mkdtemp(prefix='quizbot_vector_bench_')
+os.environ.setdefault('VECTOR_DB_PATH', os.path.join(_workdir, 'default'))
+
+from app.config import settings
+from app.services.vector_db import VectorDBService, vector_db
+from benchmarks._timing import measure, print_table
+
+TOPICS = ['scholarship fund', 'food pantry', 'literacy program', 'animal shelter', 'clean water project',
+          'youth sports league', 'hospice care', 'arts education', 'disaster relief', 'community garden']
+TEMPLATES = [
+    "Thank you for your gift of ${amount} to the {topic}. Your support reached {n} families this year.",
+    "Please join us at the {topic} gala on May {day}. Tickets support {n} participants.",
+    "Our {topic} impact report is here: {n} people served and {day} new volunteers recruited.",
+    "We are seeking volunteers for the {topic}. Even {day} hours a month helps {n} neighbors.",
+    "Your monthly donation of ${amount} keeps the {topic} running. We are grateful for your partnership.",
+]
+
+def synthetic_email(rng: random.Random) -> str:
+    sentences = [
+        rng.choice(TEMPLATES).format(topic=rng.choice(TOPICS), amount=rng.randint(10, 5000),
+                                     n=rng.randint(5, 900), day=rng.randint(1, 28))
+        for _ in range(rng.randint(3, 8))
+    ]
+    return " ".join(sentences)
+
+def make_service(backend: str) -> VectorDBService:
+    """Fresh, empty service for backend in its own directory"""
+    settings.VECTOR_DB_TYPE = backend
+    settings.VECTOR_DB_PATH = tempfile.mkdtemp(dir=_workdir)
+    return VectorDBService()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['chromadb', 'faiss'], choices=['chromadb', 'faiss'])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 10000])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    largest = max(args.sizes)
+    corpus = [synthetic_email(rng) for _ in range(largest)]
+    queries = [synthetic_email(rng) for _ in range(args.queries)]
+
+    model = vector_db.embedding_model
+    print_table("Embedding (all-MiniLM-L6-v2)", [
+        ("encode one email", measure(lambda: model.encode(corpus[0]), rounds=args.rounds)),
+    ])
+
+    for backend in args.backends:
+        rows = []
+        for size in sorted(args.sizes):
+            service = make_service(backend)
+
+            t0 = time.perf_counter()
+            for i, content in enumerate(corpus[:size]):
+                service.add_email(f"email_{i}", content, {'source': 'bench'})
+            add_per_call = (time.perf_counter() - t0) / size
+            rows.append((f"add_email @ {size:,} (load, per call)", {
+                'min': add_per_call, 'median': add_per_call, 'mean': add_per_call,
+                'stddev': 0.0, 'ops': 1 / add_per_call
+            }))
+
+            query_iter = itertools.count()
+            rows.append((f"search_similar @ {size:,}", measure(
+                lambda: service.search_similar(queries[next(query_iter) % len(queries)], top_k=args.top_k),
+                rounds=args.rounds
+            )))
+        print_table(f"VectorDBService [{backend}]", rows)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test for the QuizBot API
+
+Starts the app under uvicorn with offline backends (fake LLM, SQLite storage,
+locally signed JWTs instead of Firebase), then drives the hot endpoints at a
+fixed concurrency:
+
+    POST /api/quiz/generate
+    POST /api/quiz/evaluate
+    GET  /api/analytics/progress
+    GET  /api/analytics/history
+
+and reports throughput, p50/p95/p99 latency and server RSS. Results can be
+saved as a baseline and later runs compared against it; the script exits
+non-zero when a run regresses past --threshold.
+
+Usage (from backend/):
+    python -m benchmarks.load_test --requests 200 --concurrency 16
+    python -m benchmarks.load_test --save-baseline
+    python -m benchmarks.load_test --baseline benchmarks/baselines/load_test.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import httpx
+from jose import jwt
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, 'benchmarks', 'baselines', 'load_test.json')
+SECRET_KEY = 'load-test-secret'
+
+SAMPLE_EMAIL = """Dear Friend,
+
+Thank you for your generous gift of $250 to our Spring Literacy Campaign. Because of donors
+like you, 120 children in our after-school program received new books and weekly tutoring.
+Your continued partnership means volunteers can keep the reading room open on Saturdays.
+
+We would love to see you at our annual appreciation event next month, where students will
+share what they have learned. As a monthly donor you can also join our stewardship circle.
+
+With gratitude,
+The Development Team"""
+
+# ============================================
+# SERVER
+# ============================================
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def server_env(workdir: str, args) -> Dict[str, str]:
+    """Environment for an app instance with no external services"""
+    env = dict(os.environ)
+    env.update({
+        'AUTH_PROVIDER': 'local',
+        'STORAGE_BACKEND': 'sql',
+        'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'quizbot.db')}",
+        'JOB_QUEUE_PATH': os.path.join(workdir, 'jobs.db'),
+        'VECTOR_DB_PATH': os.path.join(workdir, 'vector_store'),
+        'LLM_PROVIDER': 'fake',
+        'LLM_CONTEXT_CACHE': 'false',
+        'LLM_REQUESTS_PER_MINUTE': '0',
+        'FAKE_LLM_LATENCY_MS': str(args.llm_latency_ms),
+        'FAKE_LLM_LATENCY_STDDEV_MS': str(args.llm_latency_ms // 3),
+        'FAKE_LLM_SEED': '0',
+        'QUESTION_BANK_ENABLED': 'false',
+        'SECRET_KEY': SECRET_KEY,
+        'GEMINI_API_KEY': 'unused',
+    })
+    return env
+
+def start_server(port: int, env: Dict[str, str], log_path: str) -> subprocess.Popen:
+    log = open(log_path, 'w')
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app',
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+async def wait_until_healthy(client: httpx.AsyncClient, proc: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode} during startup")
+        try:
+            if (await client.get('/health')).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"Server not healthy after {timeout:.0f}s")
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of pid in MB (Linux only)"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+async def sample_rss(pid: int, samples: List[float], interval: float = 0.5):
+    while True:
+        rss = read_rss_mb(pid)
+        if rss is not None:
+            samples.append(rss)
+        await asyncio.sleep(interval)
+
+# ============================================
+# LOAD
+# ============================================
+
+def local_id_token(uid: str) -> str:
+    """Token accepted by the app when AUTH_PROVIDER=local"""
+    return jwt.encode(
+        {'sub': uid, 'email': f'{uid}@loadtest.example', 'exp': datetime.utcnow() + timedelta(hours=2)},
+        SECRET_KEY, algorithm='HS256'
+    )
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+async def run_phase(name: str, make_request, total: int, concurrency: int) -> Dict:
+    """Issue total requests with at most concurrency in flight; make_request(i) returns a response"""
+    latencies, errors, responses = [], 0, [None] * total
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                response = await make_request(i)
+            except httpx.HTTPError:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - t0)
+            if response.status_code >= 400:
+                errors += 1
+            else:
+                responses[i] = response
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+
+    stats = {
+        'requests': total,
+        'errors': errors,
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+    print(f"  {name:<10} {stats['throughput_rps']:8.1f} req/s   p50 {stats['p50_ms']:8.1f} ms   "
+          f"p95 {stats['p95_ms']:8.1f} ms   p99 {stats['p99_ms']:8.1f} ms   errors {errors}")
+    return {'stats': stats, 'responses': responses}
+
+async def run_load(args, base_url: str, server_pid: int) -> Dict:
+    rss_samples: List[float] = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        rss_task = asyncio.create_task(sample_rss(server_pid, rss_samples))
+        try:
+            tokens = []
+            for u in range(args.users):
+                response = await client.post('/api/auth/login', json={'id_token': local_id_token(f'load_user_{u}')})
+                response.raise_for_status()
+                tokens.append(response.json()['access_token'])
+
+            def headers(i: int) -> Dict[str, str]:
+                return {'Authorization': f'Bearer {tokens[i % len(tokens)]}'}
+
+            # Vary the email so single-flight dedupe doesn't collapse the phase into one call
+            async def generate(i: int):
+                return await client.post('/api/quiz/generate', headers=headers(i), json={
+                    'donor_email': f"{SAMPLE_EMAIL}\n\nRef: {i}",
+                    'num_questions': args.num_questions
+                })
+
+            print(f"\nLoad: {args.requests} requests/phase, concurrency {args.concurrency}, {args.users} users")
+            results = {}
+            phase = await run_phase('generate', generate, args.requests, args.concurrency)
+            results['generate'] = phase['stats']
+            quizzes = [(i, r.json()) for i, r in enumerate(phase['responses']) if r is not None]
+
+            # Each quiz can only be evaluated once, so this phase is sized by generate's successes
+            async def evaluate(n: int):
+                i, quiz = quizzes[n]
+                return await client.post('/api/quiz/evaluate', headers=headers(i), json={
+                    'quiz_id': quiz['quiz_id'],
+                    'answers': [{'question_id': q['id'], 'selected_answer': 'A'} for q in quiz['questions']]
+                })
+
+            results['evaluate'] = (await run_phase('evaluate', evaluate, len(quizzes), args.concurrency))['stats']
+
+            async def progress(i: int):
+                return await client.get('/api/analytics/progress', headers=headers(i))
+
+            async def history(i: int):
+                return await client.get('/api/analytics/history', headers=headers(i))
+
+            results['progress'] = (await run_phase('progress', progress, args.requests, args.concurrency))['stats']
+            results['history'] = (await run_phase('history', history, args.requests, args.concurrency))['stats']
+        finally:
+            rss_task.cancel()
+            await asyncio.gather(rss_task, return_exceptions=True)
+
+    rss = {
+        'peak_mb': round(max(rss_samples), 1) if rss_samples else None,
+        'final_mb': round(rss_samples[-1], 1) if rss_samples else None,
+    }
+    if rss['peak_mb'] is not None:
+        print(f"  server RSS  peak {rss['peak_mb']:.1f} MB, final {rss['final_mb']:.1f} MB")
+    return {'endpoints': results, 'rss': rss}
+
+# ============================================
+# BASELINES
+# ============================================
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Regressions beyond threshold (fractional) in p95 latency, throughput, errors or peak RSS"""
+    regressions = []
+    for endpoint, base in baseline['endpoints'].items():
+        now = current['endpoints'].get(endpoint)
+        if not now:
+            continue
+        if base['p95_ms'] and now['p95_ms'] > base['p95_ms'] * (1 + threshold):
+            regressions.append(f"{endpoint}: p95 {base['p95_ms']:.1f} -> {now['p95_ms']:.1f} ms")
+        if base['throughput_rps'] and now['throughput_rps'] < base['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{endpoint}: throughput {base['throughput_rps']:.1f} -> {now['throughput_rps']:.1f} req/s")
+        if now['errors'] > base['errors']:
+            regressions.append(f"{endpoint}: errors {base['errors']} -> {now['errors']}")
+
+    base_rss, now_rss = baseline.get('rss', {}).get('peak_mb'), current['rss'].get('peak_mb')
+    if base_rss and now_rss and now_rss > base_rss * (1 + threshold):
+        regressions.append(f"peak RSS {base_rss:.1f} -> {now_rss:.1f} MB")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200, help='requests per phase')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--num-questions', type=int, default=5)
+    parser.add_argument('--llm-latency-ms', type=int, default=300, help='mean fake LLM latency')
+    parser.add_argument('--timeout', type=float, default=120.0, help='per-request timeout (s)')
+    parser.add_argument('--startup-timeout', type=float, default=120.0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare against or save to')
+    parser.add_argument('--save-baseline', action='store_true', help='write this run to --baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed fractional regression')
+    parser.add_argument('--output', default=None, help='also write this run as JSON')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='quizbot_load_')
+    port = free_port()
+    log_path = os.path.join(workdir, 'server.log')
+    proc = start_server(port, server_env(workdir, args), log_path)
+    print(f"Server pid {proc.pid} on port {port} (log: {log_path})")
+
+    async def run():
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}') as client:
+            await wait_until_healthy(client, proc, args.startup_timeout)
+        return await run_load(args, f'http://127.0.0.1:{port}', proc.pid)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    run_record = {
+        **results,
+        'config': {
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'users': args.users,
+            'num_questions': args.num_questions,
+            'llm_latency_ms': args.llm_latency_ms,
+        },
+        'host': {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count()},
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(run_record, f, indent=2)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(run_record, f, indent=2)
+        print(f"\n✓ Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('config') != run_record['config']:
+        print("\n⚠️ Baseline was recorded with a different configuration; comparison may be misleading")
+
+    regressions = compare(run_record, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ Regressions beyond {args.threshold:.0%} vs {args.baseline}:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print(f"\n✓ No regressions beyond {args.threshold:.0%} vs baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Find near-duplicate emails in the vector store (same text up to dates, amounts,
+phone numbers and email addresses) and optionally delete all but the first of each
+"""
+
+import argparse
+
+from app.config import settings
+from app.services.vector_db import vector_db
+from app.utils.near_duplicate import find_near_duplicates
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threshold", type=float, default=settings.NEAR_DUPLICATE_THRESHOLD,
+                        help="estimated Jaccard similarity of entity-masked shingles")
+    parser.add_argument("--apply", action="store_true", help="delete the duplicates (default: report only)")
+    args = parser.parse_args()
+
+    emails = vector_db.get_all_emails()
+    print(f"Scanning {len(emails):,} emails in {settings.VECTOR_DB_TYPE}...")
+    duplicates = find_near_duplicates(
+        ((email["id"], email["content"]) for email in emails),
+        threshold=args.threshold,
+        min_words=settings.NEAR_DUPLICATE_MIN_WORDS
+    )
+    print(f"Found {len(duplicates):,} near-duplicates of {len(set(duplicates.values())):,} emails")
+
+    if args.apply and duplicates:
+        removed = vector_db.delete_emails(list(duplicates))
+        print(f"✓ Deleted {removed:,} near-duplicate emails")
+    elif duplicates:
+        print("Run again with --apply to delete them")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Bulk import donor correspondence from mbox files and maildir directories
+Interrupted imports resume from their checkpoint when run again
+"""
+
+import argparse
+
+from app.models.database import SessionLocal, db_service
+from app.services.email_ingest import EmailIngestPipeline
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="+", help="mbox files and/or maildir directories")
+    parser.add_argument("--user-id", required=True, help="uid of the user the emails belong to")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: INGEST_WORKERS)")
+    parser.add_argument("--batch-size", type=int, default=None, help="messages per batch (default: INGEST_BATCH_SIZE)")
+    parser.add_argument("--restart", action="store_true", help="ignore existing checkpoints and start over")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        if not db_service.get_user_by_uid(db, args.user_id):
+            parser.error(f"no user with uid {args.user_id}")
+
+    pipeline = EmailIngestPipeline(args.user_id, workers=args.workers, batch_size=args.batch_size)
+    for source in args.sources:
+        print(f"Importing {source}...")
+        stats = pipeline.ingest(source, restart=args.restart)
+        print(f"  {stats['processed']:,} messages: {stats['inserted']:,} imported, "
+              f"{stats['duplicates']:,} duplicates, {stats['skipped']:,} without text, {stats['failed']:,} unparseable")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Convert the Chroma vector store to normalized embeddings with cosine distance
+
+Collections created before embeddings were normalized use L2 distance over
+raw vectors. This copies every email into a fresh cosine collection,
+normalizing the stored embeddings (or re-encoding the documents with
+--reencode), then swaps it in. Safe to run again on a converted store.
+"""
+
+import argparse
+
+from app.config import settings
+from app.services.vector_db import vector_db
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reencode", action="store_true",
+                        help="embed the documents again instead of normalizing the stored embeddings")
+    parser.add_argument("--page-size", type=int, default=1000, help="emails copied per batch")
+    args = parser.parse_args()
+
+    if settings.VECTOR_DB_TYPE != "chromadb":
+        print("The FAISS index lives in memory and is built normalized with "
+              f"VECTOR_FAISS_STORAGE={settings.VECTOR_FAISS_STORAGE}; nothing to migrate")
+        return
+
+    space = (vector_db.collection.metadata or {}).get("hnsw:space", "l2")
+    print(f"Migrating {vector_db.count():,} emails (currently {space})...")
+    copied = vector_db.rebuild(page_size=args.page_size, reencode=args.reencode)
+    print(f"✓ Copied {copied:,} emails into a cosine collection")
+
+if __name__ == "__main__":
+    main()
@@ -72,7 +72,7 @@ export const quizAPI = {
   },
   evaluateQuiz: async (quiz, answers) => {
     const response = await api.post('/api/quiz/evaluate', {
-      quiz: quiz,
+      quiz_id: quiz.quiz_id,
       answers: answers,
     });
     return response.data;